@@ -1,39 +1,142 @@
+import time
+IMPORT_STARTED = time.perf_counter()  # Start of the module import, for the startup timings
+
 import os
+import atexit
+import click
+import contextvars
 import logging
+import hashlib
 import json
-from datetime import datetime
-from flask import Flask, request, jsonify
+import queue
+import tempfile
+import threading
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from flask import Blueprint, Flask, Response, g, request, jsonify
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
 from dotenv import load_dotenv
-import openai
-from openai import OpenAI
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from flask_bcrypt import Bcrypt
 from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import IntegrityError
+from llm_cache import LRUCache, CacheStats, make_cache_key
+from job_queue import InflightTracker, JobWorkerPool
+from llm_backends import create_backend_from_env
+from rate_limiter import create_limiter_from_env
+from llm_retry import create_caller_from_env
+from singleflight import SingleFlight, InflightLockTable
+from write_behind import BufferFull, WriteBehindBuffer
+from leaderboard import Leaderboard
+from metrics import MetricsRegistry, StageTimer, start_request_timings
+from rate_limiter import RateLimitTimeout
+from json_extract import extract_json
+from matching import EntryMatcher, match_entries
+from sqlalchemy import event, func, and_, or_, case, delete, insert, select, text, tuple_, update
+from sqlalchemy.orm import load_only
 
 # Load environment variables
 load_dotenv()
-OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 DATABASE_URL = os.getenv('DATABASE_URL', 'postgresql://localhost/llm_leetcode')
 
-# Set up OpenAI client (v1+)
-client = OpenAI(api_key=OPENAI_API_KEY)
+# Bounded pool for running a submission's test cases against the LLM concurrently.
+# Shared by all requests so the total number of in-flight OpenAI calls stays capped.
+# By default it is sized so every request thread (SERVER_THREADS, see gunicorn.conf.py)
+# can have a typical 4-case submission evaluating at once; the rate limiter still
+# bounds what actually reaches the provider.
+SERVER_THREADS = int(os.getenv('SERVER_THREADS', '64'))
+LLM_MAX_WORKERS = int(os.getenv('LLM_MAX_WORKERS', str(4 * SERVER_THREADS)))
+llm_executor = ThreadPoolExecutor(max_workers=LLM_MAX_WORKERS, thread_name_prefix='llm')
+
+# Set up the LLM backend (OpenAI by default, LLM_BACKEND=fake for offline runs)
+llm_backend = create_backend_from_env(max_concurrent_calls=LLM_MAX_WORKERS)
+
+# Model and sampling parameters used for every evaluation call
+LLM_MODEL = os.getenv('LLM_MODEL', 'gpt-4o')
+LLM_PARAMS = {
+    'temperature': float(os.getenv('LLM_TEMPERATURE', '0')),
+    'max_tokens': int(os.getenv('LLM_MAX_TOKENS', '1000'))
+}
+
+# Two-tier LLM response cache: in-process LRU in front of the shared llm_response_cache table.
+# Entries are (response, tokens the call that produced it used).
+LLM_CACHE_ENABLED = os.getenv('LLM_CACHE_ENABLED', 'true').lower() == 'true'
+LLM_CACHE_TTL = int(os.getenv('LLM_CACHE_TTL', '86400'))
+response_cache = LRUCache(max_size=int(os.getenv('LLM_CACHE_SIZE', '2048')), ttl=LLM_CACHE_TTL)
+cache_stats = CacheStats()
+
+# Shared RPM/TPM budget for upstream LLM calls across all workers on this host
+rate_limiter = create_limiter_from_env()
+
+# Retries with jittered backoff (and optional hedging) for upstream LLM calls,
+# all bounded by a per-submission deadline
+llm_caller = create_caller_from_env(
+    max_concurrent_calls=LLM_MAX_WORKERS, throttled=lambda: rate_limiter.waiting() > 0
+)
+SUBMISSION_DEADLINE = float(os.getenv('SUBMISSION_DEADLINE', '90'))
+
+# Coalesce identical in-flight LLM calls; optionally across workers through a local lock table
+singleflight = SingleFlight()
+inflight_locks = InflightLockTable(
+    os.getenv('LLM_SINGLEFLIGHT_DB', os.path.join(tempfile.gettempdir(), 'llm_leetcode_inflight.sqlite'))
+) if os.getenv('LLM_SINGLEFLIGHT_CROSS_WORKER', 'false').lower() == 'true' else None
+
+# Prometheus metrics for this process, served at /metrics
+metrics = MetricsRegistry()
+stage_timer = StageTimer(metrics.histogram(
+    'llm_leetcode_stage_seconds', 'Time spent in each stage of evaluating a submission', ['stage']
+))
+http_requests = metrics.counter(
+    'llm_leetcode_http_requests_total', 'HTTP requests by endpoint, method and status', ['endpoint', 'method', 'status']
+)
+http_latency = metrics.histogram(
+    'llm_leetcode_http_request_seconds', 'Time to produce the response, by endpoint', ['endpoint']
+)
+llm_requests = metrics.counter(
+    'llm_leetcode_llm_requests_total',
+    'Completions requested by evaluations, by how they were served (memory_hit, db_hit, coalesced, fetched, error)',
+    ['outcome']
+)
+upstream_calls = metrics.counter(
+    'llm_leetcode_llm_upstream_calls_total', 'Requests sent to the LLM provider (including retries and hedges)', ['outcome']
+)
+upstream_retries = metrics.counter(
+    'llm_leetcode_llm_retries_total', 'Extra upstream attempts made by the retry policy', ['kind']
+)
+llm_tokens = metrics.counter('llm_leetcode_llm_tokens_total', 'Tokens billed by the LLM provider')
+llm_call_tokens = metrics.histogram(
+    'llm_leetcode_llm_call_tokens', 'Tokens billed per upstream LLM call',
+    buckets=(100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+)
+rate_limit_timeouts = metrics.counter(
+    'llm_leetcode_rate_limit_timeouts_total', 'LLM calls refused because the shared budget stayed exhausted'
+)
 
-app = Flask(__name__)
-app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'your-secret-key-change-this')
-app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'your-jwt-secret-key-change-this')
-app.config['SQLALCHEMY_DATABASE_URI'] = DATABASE_URL
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Routes, hooks and CLI commands live on a blueprint; create_app() builds the Flask app
+api = Blueprint('api', __name__, cli_group=None)
 
-# Initialize extensions
-db = SQLAlchemy(app)
-CORS(app)
-bcrypt = Bcrypt(app)
-jwt = JWTManager(app)
+# Extensions are bound to the app in create_app()
+db = SQLAlchemy()
+bcrypt = Bcrypt()
+jwt = JWTManager()
 login_manager = LoginManager()
-login_manager.init_app(app)
-login_manager.login_view = 'login'
+login_manager.login_view = 'api.login'
+
+# Database connection pool (ignored for SQLite). Size it to the number of threads that
+# touch the database concurrently per process: request threads plus job workers.
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '20'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '10'))
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+
+# Seconds a graceful shutdown waits for running jobs and evaluations: long enough for one
+# started just before the shutdown to reach its deadline and be saved. Buffered attempt
+# writes then get ATTEMPT_DRAIN_TIMEOUT on top.
+SHUTDOWN_TIMEOUT = float(os.getenv('SHUTDOWN_TIMEOUT', str(SUBMISSION_DEADLINE + 10)))
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -52,10 +155,10 @@ class User(UserMixin, db.Model):
     prompt_attempts = db.relationship('PromptAttempt', backref='user', lazy=True)
     
     def set_password(self, password):
-        self.password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
+        self.password_hash = run_bcrypt(bcrypt.generate_password_hash, password).decode('utf-8')
     
     def check_password(self, password):
-        return bcrypt.check_password_hash(self.password_hash, password)
+        return run_bcrypt(bcrypt.check_password_hash, self.password_hash, password)
 
 class PromptAttempt(db.Model):
     __tablename__ = 'prompt_attempts'
@@ -72,6 +175,11 @@ class PromptAttempt(db.Model):
     model = db.Column(db.String(50), default='gpt-4o')
     tokens_used = db.Column(db.Integer, default=0)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        # Serves the newest-first keyset pagination of a user's attempts
+        db.Index('idx_prompt_attempts_user_created', 'user_id', created_at.desc(), id.desc()),
+    )
 
 class Question(db.Model):
     __tablename__ = 'questions'
@@ -83,6 +191,109 @@ class Question(db.Model):
     difficulty = db.Column(db.String(20), default='medium')
     category = db.Column(db.String(100), default='data_extraction')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class LLMResponseCache(db.Model):
+    __tablename__ = 'llm_response_cache'
+    
+    cache_key = db.Column(db.String(64), primary_key=True)  # SHA-256 of model, params and prompt
+    model = db.Column(db.String(50), nullable=False)
+    response = db.Column(db.Text, nullable=False)
+    tokens_used = db.Column(db.Integer, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class SubmissionJob(db.Model):
+    __tablename__ = 'submission_jobs'
+    
+    id = db.Column(db.String(36), primary_key=True)  # UUID handed back to the client
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    question_id = db.Column(db.String(255), db.ForeignKey('questions.id'), nullable=False)
+    user_prompt = db.Column(db.Text, nullable=False)
+    bypass_cache = db.Column(db.Boolean, default=False)
+    batch = db.Column(db.Boolean, default=False)
+    status = db.Column(db.String(20), default='queued')  # queued, running, completed, failed
+    completed_cases = db.Column(db.Integer, default=0)
+    total_cases = db.Column(db.Integer, default=0)
+    result = db.Column(db.JSON)  # Same shape as the /submit-prompt response
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        # Finds queued and stalled jobs when a worker starts
+        db.Index('idx_submission_jobs_status', 'status', 'updated_at'),
+    )
+
+class UserStats(db.Model):
+    __tablename__ = 'user_stats'
+    
+    # Running totals over prompt_attempts, kept in step with every insert
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    total_attempts = db.Column(db.Integer, nullable=False, default=0)
+    correct_solutions = db.Column(db.Integer, nullable=False, default=0)
+    tokens_used = db.Column(db.Integer, nullable=False, default=0)
+    last_attempt_at = db.Column(db.DateTime)
+
+class UserQuestionStats(db.Model):
+    __tablename__ = 'user_question_stats'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    question_id = db.Column(db.String(255), db.ForeignKey('questions.id'), primary_key=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    # The user's best attempt (highest score, then fewest tokens, then earliest); this is their leaderboard entry
+    best_score = db.Column(db.Float, nullable=False, default=0.0)
+    best_tokens = db.Column(db.Integer, nullable=False, default=0)
+    best_attempt_id = db.Column(db.Integer)
+    best_at = db.Column(db.DateTime)
+    last_attempt_at = db.Column(db.DateTime)
+    
+    __table_args__ = (
+        db.Index('idx_user_question_stats_leaderboard', 'question_id', best_score.desc(), best_tokens, best_at),
+    )
+
+def normalize_expected_output(expected_output):
+    """Convert expected_output to a list of entries if it's a single object."""
+    if isinstance(expected_output, dict):
+        return [expected_output]
+    return expected_output
+
+class QuestionValidator:
+    """
+    Validation state for one version of a question, compiled once and reused.
+    
+    Holds each test case's normalised expected output together with its entry
+    matcher (key sets, canonical projections), so submissions don't rebuild them.
+    """
+    
+    def __init__(self, test_cases):
+        self.test_cases = test_cases
+        self.matchers = [
+            EntryMatcher(normalize_expected_output(test_case['expected_output']))
+            for test_case in test_cases
+        ]
+    
+    def validate(self, index, model_response):
+        """Validate a model response against the test case at index."""
+        return validate_single_test_case(model_response, self.test_cases[index], self.matchers[index])
+
+# Compiled validators per question id, tagged with the question version they were built from
+validator_cache = LRUCache(max_size=int(os.getenv('VALIDATOR_CACHE_SIZE', '256')), ttl=float('inf'))
+
+def get_question_validator(question):
+    """Return the compiled validator for a question, rebuilding it if the question changed."""
+    version = question.updated_at or question.created_at
+    cached = validator_cache.get(question.id)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    
+    validator = QuestionValidator(question.test_cases)
+    validator_cache.set(question.id, (version, validator))
+    return validator
+
+@event.listens_for(Question, 'after_update')
+@event.listens_for(Question, 'after_delete')
+def invalidate_question_validator(mapper, connection, target):
+    validator_cache.delete(target.id)
 
 def validate_multiple_test_cases(model_response, test_cases):
     """
@@ -99,44 +310,8 @@ def validate_multiple_test_cases(model_response, test_cases):
         # Parse the model response
         response_text = model_response.strip()
         
-        # Look for JSON array or object in the response
-        json_start = response_text.find('[')
-        if json_start == -1:
-            json_start = response_text.find('{')
-        
-        if json_start != -1:
-            # Extract JSON part
-            json_part = response_text[json_start:]
-            # Find the matching closing bracket/brace
-            if json_part.startswith('['):
-                bracket_count = 0
-                for i, char in enumerate(json_part):
-                    if char == '[':
-                        bracket_count += 1
-                    elif char == ']':
-                        bracket_count -= 1
-                        if bracket_count == 0:
-                            json_part = json_part[:i+1]
-                            break
-            elif json_part.startswith('{'):
-                brace_count = 0
-                for i, char in enumerate(json_part):
-                    if char == '{':
-                        brace_count += 1
-                    elif char == '}':
-                        brace_count -= 1
-                        if brace_count == 0:
-                            json_part = json_part[:i+1]
-                            break
-            
-            try:
-                parsed_response = json.loads(json_part)
-            except json.JSONDecodeError:
-                # If that fails, try parsing the entire response
-                parsed_response = json.loads(response_text)
-        else:
-            # No JSON found, try parsing the entire response
-            parsed_response = json.loads(response_text)
+        # Extract the JSON array or object embedded in the response
+        parsed_response = extract_json(response_text)
         
         # Ensure parsed_response is a list for comparison
         if isinstance(parsed_response, dict):
@@ -162,29 +337,8 @@ def validate_multiple_test_cases(model_response, test_cases):
             if isinstance(expected_output, dict):
                 expected_output = [expected_output]
             
-            # Check if all expected entries are present
-            missing_entries = []
-            found_entries = []
-            
-            for expected_entry in expected_output:
-                found = False
-                for response_entry in parsed_response:
-                    if isinstance(response_entry, dict) and isinstance(expected_entry, dict):
-                        # Check if all keys in expected_entry match
-                        if all(key in response_entry and response_entry[key] == expected_entry[key] 
-                               for key in expected_entry.keys()):
-                            found = True
-                            found_entries.append(response_entry)
-                            break
-                
-                if not found:
-                    missing_entries.append(expected_entry)
-            
-            # Check for extra entries
-            extra_entries = []
-            for response_entry in parsed_response:
-                if response_entry not in found_entries:
-                    extra_entries.append(response_entry)
+            # Check which expected entries are present and which response entries are extra
+            found_entries, missing_entries, extra_entries = match_entries(expected_output, parsed_response)
             
             case_passed = len(missing_entries) == 0
             case_score = len(found_entries) / len(expected_output) if expected_output else 0.0
@@ -237,13 +391,14 @@ def validate_multiple_test_cases(model_response, test_cases):
             'parsed_response': None
         }
 
-def validate_single_test_case(model_response, test_case):
+def validate_single_test_case(model_response, test_case, matcher=None):
     """
     Validate if the model's response passes a single test case.
     
     Args:
         model_response (str): The model's response
         test_case (dict): Test case with input and expected_output
+        matcher (EntryMatcher): Optional precompiled matcher for this test case's expected output
     
     Returns:
         dict: Validation result with pass/fail, score, and details
@@ -252,64 +407,18 @@ def validate_single_test_case(model_response, test_case):
         # Parse the model response
         response_text = model_response.strip()
         
-        # Look for JSON array or object in the response
-        json_start = response_text.find('[')
-        if json_start == -1:
-            json_start = response_text.find('{')
-        
-        if json_start != -1:
-            # Extract JSON part
-            json_part = response_text[json_start:]
-            # Find the matching closing bracket/brace
-            if json_part.startswith('['):
-                bracket_count = 0
-                for i, char in enumerate(json_part):
-                    if char == '[':
-                        bracket_count += 1
-                    elif char == ']':
-                        bracket_count -= 1
-                        if bracket_count == 0:
-                            json_part = json_part[:i+1]
-                            break
-            elif json_part.startswith('{'):
-                brace_count = 0
-                for i, char in enumerate(json_part):
-                    if char == '{':
-                        brace_count += 1
-                    elif char == '}':
-                        brace_count -= 1
-                        if brace_count == 0:
-                            json_part = json_part[:i+1]
-                            break
-            
-            try:
-                parsed_response = json.loads(json_part)
-            except json.JSONDecodeError:
-                # If that fails, try parsing the entire response
-                try:
-                    parsed_response = json.loads(response_text)
-                except json.JSONDecodeError:
-                    # If JSON parsing completely fails, return the raw response
-                    return {
-                        'pass': False,
-                        'score': 0.0,
-                        'missing_entries': test_case['expected_output'],
-                        'extra_entries': [],
-                        'parsed_response': response_text  # Return raw response instead of None
-                    }
-        else:
-            # No JSON found, try parsing the entire response
-            try:
-                parsed_response = json.loads(response_text)
-            except json.JSONDecodeError:
-                # If JSON parsing completely fails, return the raw response
-                return {
-                    'pass': False,
-                    'score': 0.0,
-                    'missing_entries': test_case['expected_output'],
-                    'extra_entries': [],
-                    'parsed_response': response_text  # Return raw response instead of None
-                }
+        # Extract the JSON array or object embedded in the response
+        try:
+            parsed_response = extract_json(response_text)
+        except json.JSONDecodeError:
+            # If JSON parsing completely fails, return the raw response
+            return {
+                'pass': False,
+                'score': 0.0,
+                'missing_entries': test_case['expected_output'],
+                'extra_entries': [],
+                'parsed_response': response_text  # Return raw response instead of None
+            }
         
         # Ensure parsed_response is a list for comparison
         if isinstance(parsed_response, dict):
@@ -323,35 +432,14 @@ def validate_single_test_case(model_response, test_case):
                 'parsed_response': response_text  # Return raw response instead of None
             }
         
-        expected_output = test_case['expected_output']
-        
-        # Convert expected_output to list if it's not already
-        if isinstance(expected_output, dict):
-            expected_output = [expected_output]
-        
-        # Check if all expected entries are present
-        missing_entries = []
-        found_entries = []
-        
-        for expected_entry in expected_output:
-            found = False
-            for response_entry in parsed_response:
-                if isinstance(response_entry, dict) and isinstance(expected_entry, dict):
-                    # Check if all keys in expected_entry match
-                    if all(key in response_entry and response_entry[key] == expected_entry[key] 
-                           for key in expected_entry.keys()):
-                        found = True
-                        found_entries.append(response_entry)
-                        break
+        if matcher is not None:
+            expected_output = matcher.expected_output
+            found_entries, missing_entries, extra_entries = matcher.match(parsed_response)
+        else:
+            expected_output = normalize_expected_output(test_case['expected_output'])
             
-            if not found:
-                missing_entries.append(expected_entry)
-        
-        # Check for extra entries
-        extra_entries = []
-        for response_entry in parsed_response:
-            if response_entry not in found_entries:
-                extra_entries.append(response_entry)
+            # Check which expected entries are present and which response entries are extra
+            found_entries, missing_entries, extra_entries = match_entries(expected_output, parsed_response)
         
         passed = len(missing_entries) == 0
         score = len(found_entries) / len(expected_output) if expected_output else 0.0
@@ -373,7 +461,880 @@ def validate_single_test_case(model_response, test_case):
             'parsed_response': model_response  # Return raw response instead of None
         }
 
-@app.route('/submit-prompt', methods=['POST'])
+def call_llm(full_prompt, params):
+    """Send one request to the LLM backend within the shared rate-limit budget."""
+    # Wait (bounded) for request and token budget; the estimate is corrected from actual usage
+    try:
+        with stage_timer.time('rate_limit_wait'):
+            reserved_tokens = rate_limiter.acquire(estimate_tokens(full_prompt) + params['max_tokens'])
+    except RateLimitTimeout:
+        rate_limit_timeouts.inc()
+        raise
+    try:
+        with stage_timer.time('llm_call'):
+            started = time.monotonic()
+            response = llm_backend.complete(full_prompt, model=LLM_MODEL, **params)
+            # Hedging thresholds come from the upstream latency alone, not the budget wait
+            llm_caller.record_latency(time.monotonic() - started)
+    except Exception:
+        upstream_calls.inc(outcome='error')
+        rate_limiter.reconcile(reserved_tokens, 0)
+        raise
+    upstream_calls.inc(outcome='success')
+    llm_tokens.inc(response.total_tokens)
+    llm_call_tokens.observe(response.total_tokens)
+    rate_limiter.reconcile(reserved_tokens, response.total_tokens)
+    return response
+
+def lookup_db_cache(cache_key):
+    """Return a fresh (response, tokens_used) from the persistent cache tier, or None."""
+    try:
+        entry = LLMResponseCache.query.get(cache_key)
+        fresh = entry is not None and entry.created_at >= datetime.utcnow() - timedelta(seconds=LLM_CACHE_TTL)
+        response = (entry.response, entry.tokens_used or 0) if fresh else None
+        # Return the connection to the pool before a miss turns into a slow LLM call
+        db.session.commit()
+    except Exception as e:
+        # The persistent tier is an optimisation; never fail the call because of it
+        logging.warning(f"LLM cache lookup failed: {e}")
+        db.session.rollback()
+        return None
+    return response
+
+def store_in_cache(cache_key, model_response, tokens_used):
+    """Write a response to both cache tiers."""
+    response_cache.set(cache_key, (model_response, tokens_used))
+    try:
+        db.session.merge(LLMResponseCache(
+            cache_key=cache_key,
+            model=LLM_MODEL,
+            response=model_response,
+            tokens_used=tokens_used,
+            created_at=datetime.utcnow()
+        ))
+        db.session.commit()
+    except IntegrityError:
+        # Another worker stored the same key first
+        db.session.rollback()
+    except Exception as e:
+        logging.warning(f"LLM cache write failed: {e}")
+        db.session.rollback()
+
+def get_completion(full_prompt, bypass_cache=False, max_tokens=None, deadline=None, call_stats=None, cacheable=None):
+    """
+    Get the model's response for a prompt, checking the two-tier cache first.
+    
+    Identical calls already in flight (in this process, or in another worker when
+    cross-worker single-flight is on) are waited on and shared instead of repeated.
+    
+    Args:
+        full_prompt (str): The user prompt combined with the test case dataset
+        bypass_cache (bool): Skip cache lookups and always call OpenAI
+        max_tokens (int): Override the default completion budget (used by batched mode)
+        deadline (float): time.monotonic() deadline for retries of this call
+        call_stats (dict): Optional attempts/retries/hedges/coalesced/tokens_billed counters, updated in place
+        cacheable (callable): Optional check of a response text; responses it rejects are
+            neither stored in the cache nor served from it
+    
+    Returns:
+        tuple: (model response text, tokens the prompt costs, whether it was served from cache).
+        Cache hits and shared calls report the tokens of the call that produced the response,
+        so every submission of a prompt costs the same; only tokens_billed in call_stats
+        (and the llm_tokens metric) counts what this call actually paid for.
+    """
+    params = dict(LLM_PARAMS, max_tokens=max_tokens) if max_tokens else LLM_PARAMS
+    use_cache = LLM_CACHE_ENABLED and not bypass_cache
+    cache_key = make_cache_key(LLM_MODEL, params, full_prompt)
+    
+    if use_cache:
+        with stage_timer.time('cache_lookup'):
+            tier = 'memory'
+            cached = response_cache.get(cache_key)
+            if cached is None:
+                tier = 'db'
+                cached = lookup_db_cache(cache_key)
+                if cached is not None:
+                    response_cache.set(cache_key, cached)
+        if cached is not None and cacheable is not None and not cacheable(cached[0]):
+            cached = None
+        if cached is not None:
+            cache_stats.incr(f'{tier}_hits')
+            llm_requests.inc(outcome=f'{tier}_hit')
+            cached_response, cached_tokens = cached
+            return cached_response, cached_tokens, True
+        
+        cache_stats.incr('misses')
+    else:
+        cache_stats.incr('bypassed')
+    
+    def remaining():
+        return max(0.0, deadline - time.monotonic()) if deadline is not None else None
+    
+    def fetch():
+        remote_locked = False
+        if use_cache and inflight_locks:
+            remote_locked = inflight_locks.acquire(cache_key)
+            if not remote_locked:
+                # Another worker is fetching this prompt; wait for its response to land in the shared cache
+                wait_for = remaining()
+                if inflight_locks.wait_released(cache_key, SUBMISSION_DEADLINE if wait_for is None else wait_for):
+                    shared = lookup_db_cache(cache_key)
+                    if shared is not None and (cacheable is None or cacheable(shared[0])):
+                        singleflight.record_remote_coalesced()
+                        response_cache.set(cache_key, shared)
+                        return shared[0], shared[1], True
+        try:
+            retry_stats = {}
+            try:
+                response = llm_caller.call(lambda: call_llm(full_prompt, params), deadline=deadline, stats=retry_stats)
+            finally:
+                upstream_retries.inc(retry_stats.get('retries', 0), kind='retry')
+                upstream_retries.inc(retry_stats.get('hedges', 0), kind='hedge')
+                if call_stats is not None:
+                    for key, value in retry_stats.items():
+                        call_stats[key] = call_stats.get(key, 0) + value
+            if call_stats is not None:
+                call_stats['tokens_billed'] = call_stats.get('tokens_billed', 0) + response.total_tokens
+            # Refresh both tiers even when bypassing, so the next normal lookup sees the fresh response
+            if LLM_CACHE_ENABLED and response.content is not None and (cacheable is None or cacheable(response.content)):
+                store_in_cache(cache_key, response.content, response.total_tokens)
+            return response.content, response.total_tokens, False
+        finally:
+            if remote_locked:
+                inflight_locks.release(cache_key)
+    
+    try:
+        (model_response, tokens_used, shared_remotely), shared = singleflight.do(cache_key, fetch, timeout=remaining())
+    except Exception:
+        llm_requests.inc(outcome='error')
+        raise
+    llm_requests.inc(outcome='coalesced' if shared or shared_remotely else 'fetched')
+    if (shared or shared_remotely) and call_stats is not None:
+        # Only the leading call is billed, but the prompt costs the same for everyone sharing it
+        call_stats['coalesced'] = True
+    return model_response, tokens_used, False
+
+def evaluate_test_case(user_prompt, test_case, index, bypass_cache=False, deadline=None, validator=None):
+    """
+    Run the user's prompt against a single test case and validate the response.
+    
+    Args:
+        user_prompt (str): The prompt submitted by the user
+        test_case (dict): Test case with input and expected_output
+        index (int): Zero-based position of the test case in the question
+        bypass_cache (bool): Skip the LLM response cache for this call
+        deadline (float): time.monotonic() deadline for the submission
+        validator (QuestionValidator): Compiled validator for the question, if available
+    
+    Returns:
+        tuple: (test case result dict, tokens used by the call)
+    """
+    test_input = test_case['input']
+    
+    # Combine user prompt with this specific test case input
+    full_prompt = build_full_prompt(user_prompt, test_input)
+    
+    # Send to OpenAI (or serve from cache); a failure only fails this test case
+    call_stats = {'attempts': 0, 'retries': 0, 'hedges': 0, 'coalesced': False, 'tokens_billed': 0}
+    try:
+        model_response, tokens_used, cached = get_completion(
+            full_prompt, bypass_cache=bypass_cache, deadline=deadline, call_stats=call_stats
+        )
+    except Exception as e:
+        logging.error(f"LLM API error on test case {index + 1}: {e}")
+        return {
+            'test_case_id': index + 1,
+            'input': test_input,
+            'expected_output': test_case['expected_output'],
+            'actual_output': None,
+            'passed': False,
+            'score': 0.0,
+            'missing_entries': test_case['expected_output'],
+            'extra_entries': [],
+            'error': f'LLM API error: {str(e)}',
+            'llm_calls': call_stats
+        }, 0
+    
+    # Validate this specific response against this test case
+    with stage_timer.time('validation'):
+        if validator is not None:
+            validation_result = validator.validate(index, model_response)
+        else:
+            validation_result = validate_single_test_case(model_response, test_case)
+    
+    return {
+        'test_case_id': index + 1,
+        'input': test_input,
+        'expected_output': test_case['expected_output'],
+        'actual_output': validation_result['parsed_response'],
+        'passed': validation_result['pass'],
+        'score': validation_result['score'],
+        'missing_entries': validation_result['missing_entries'],
+        'extra_entries': validation_result['extra_entries'],
+        'cached': cached,
+        'llm_calls': call_stats
+    }, tokens_used
+
+def _evaluate_in_app_context(*args, **kwargs):
+    # Executor threads need their own app context (and DB session) for cache lookups
+    with background_app_context():
+        return evaluate_test_case(*args, **kwargs)
+
+def run_test_cases(user_prompt, test_cases, bypass_cache=False, on_result=None, deadline=None, validator=None):
+    """
+    Evaluate all test cases of a question concurrently on the shared LLM executor.
+    
+    Args:
+        user_prompt (str): The prompt submitted by the user
+        test_cases (list): List of test cases with input and expected_output
+        bypass_cache (bool): Skip the LLM response cache for every case
+        on_result (callable): Optional callback invoked with each test case result as it finishes
+        deadline (float): time.monotonic() deadline for the submission
+        validator (QuestionValidator): Compiled validator for the question, if available
+    
+    Returns:
+        tuple: (test case results in test-case order, total tokens used across all cases)
+    """
+    futures = {
+        # Each case runs in a copy of the caller's context so its stage timings reach the request's breakdown
+        llm_executor.submit(
+            contextvars.copy_context().run, _evaluate_in_app_context,
+            user_prompt, test_case, i, bypass_cache, deadline, validator
+        ): i
+        for i, test_case in enumerate(test_cases)
+    }
+    outcomes = [None] * len(test_cases)
+    for future in as_completed(futures):
+        result, tokens = future.result()
+        outcomes[futures[future]] = (result, tokens)
+        if on_result:
+            on_result(result)
+    
+    test_case_results = [result for result, _ in outcomes]
+    tokens_used = sum(tokens for _, tokens in outcomes)
+    return test_case_results, tokens_used
+
+def estimate_tokens(text):
+    """Rough token count for budgeting (about 4 characters per token for English/JSON)."""
+    return len(text) // 4 + 1
+
+def build_full_prompt(user_prompt, test_input):
+    """Combine the user prompt with a single test case's dataset."""
+    return f"{user_prompt}\n\nDataset:\n{json.dumps(test_input, indent=2)}"
+
+def build_batched_prompt(user_prompt, test_cases):
+    """Combine the user prompt with every test case's dataset, labelled by number."""
+    num_cases = len(test_cases)
+    datasets = "\n\n".join(
+        f"Dataset {i + 1}:\n{json.dumps(test_case['input'], indent=2)}"
+        for i, test_case in enumerate(test_cases)
+    )
+    return (
+        f"{user_prompt}\n\n"
+        f"Apply the instructions above separately to each of the following {num_cases} datasets. "
+        f"Respond with a single JSON object and nothing else. Its keys must be the dataset numbers "
+        f"(\"1\" to \"{num_cases}\") and each value must be the output for that dataset.\n\n"
+        f"{datasets}"
+    )
+
+def split_batched_response(model_response, num_cases):
+    """
+    Split a batched response into per-case outputs.
+    
+    Returns:
+        list: One model response string per test case, or None if the response can't be split reliably
+    """
+    if not model_response:
+        return None
+    
+    try:
+        parsed = extract_json(model_response)
+    except json.JSONDecodeError:
+        return None
+    
+    if not isinstance(parsed, dict) or set(parsed.keys()) != {str(i + 1) for i in range(num_cases)}:
+        return None
+    
+    outputs = []
+    for i in range(num_cases):
+        output = parsed[str(i + 1)]
+        outputs.append(output if isinstance(output, str) else json.dumps(output))
+    return outputs
+
+def run_test_cases_batched(user_prompt, test_cases, bypass_cache=False, on_result=None, deadline=None, validator=None):
+    """
+    Evaluate all test cases with a single LLM call that sees every dataset at once.
+    
+    Args:
+        user_prompt (str): The prompt submitted by the user
+        test_cases (list): List of test cases with input and expected_output
+        bypass_cache (bool): Skip the LLM response cache
+        on_result (callable): Optional callback invoked with each test case result
+        deadline (float): time.monotonic() deadline for the submission
+        validator (QuestionValidator): Compiled validator for the question, if available
+    
+    Returns:
+        tuple: (test case results, tokens used, batch info). If the batched call failed or
+        its response could not be split, the results and batch info are None and tokens
+        used is what the failed call billed; the caller should fall back to per-case calls.
+    """
+    batched_prompt = build_batched_prompt(user_prompt, test_cases)
+    call_stats = {'attempts': 0, 'retries': 0, 'hedges': 0, 'coalesced': False, 'tokens_billed': 0}
+    try:
+        # An unsplittable response isn't cached, so the next batched submission tries again
+        model_response, tokens_used, cached = get_completion(
+            batched_prompt, bypass_cache=bypass_cache, max_tokens=LLM_PARAMS['max_tokens'] * len(test_cases),
+            deadline=deadline, call_stats=call_stats,
+            cacheable=lambda response: split_batched_response(response, len(test_cases)) is not None
+        )
+    except Exception as e:
+        logging.warning(f"Batched OpenAI call failed, falling back to per-case calls: {e}")
+        return None, call_stats['tokens_billed'], None
+    
+    outputs = split_batched_response(model_response, len(test_cases))
+    if outputs is None:
+        logging.warning("Could not split batched response, falling back to per-case calls")
+        return None, call_stats['tokens_billed'], None
+    
+    test_case_results = []
+    for i, (test_case, output) in enumerate(zip(test_cases, outputs)):
+        with stage_timer.time('validation'):
+            if validator is not None:
+                validation_result = validator.validate(i, output)
+            else:
+                validation_result = validate_single_test_case(output, test_case)
+        result = {
+            'test_case_id': i + 1,
+            'input': test_case['input'],
+            'expected_output': test_case['expected_output'],
+            'actual_output': validation_result['parsed_response'],
+            'passed': validation_result['pass'],
+            'score': validation_result['score'],
+            'missing_entries': validation_result['missing_entries'],
+            'extra_entries': validation_result['extra_entries'],
+            'cached': cached,
+            'llm_calls': call_stats  # Shared by every case in the batch
+        }
+        test_case_results.append(result)
+        if on_result:
+            on_result(result)
+    
+    # The user prompt is sent once instead of once per case
+    per_case_prompt_tokens = sum(
+        estimate_tokens(build_full_prompt(user_prompt, test_case['input'])) for test_case in test_cases
+    )
+    batch_info = {
+        'mode': 'batched',
+        'estimated_tokens_saved': max(0, per_case_prompt_tokens - estimate_tokens(batched_prompt))
+    }
+    return test_case_results, tokens_used, batch_info
+
+def _upsert(model, values, set_):
+    """Build an INSERT ... ON CONFLICT (primary key) DO UPDATE for the current database."""
+    # Dialect modules are imported here, once the engine says which one is in use
+    if db.engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    table = model.__table__
+    return dialect_insert(table).values(**values).on_conflict_do_update(
+        index_elements=[column.name for column in table.primary_key.columns],
+        set_=set_
+    )
+
+def record_attempt_stats(attempt):
+    """
+    Fold a new attempt into the user's running stats.
+    
+    Runs inside the caller's transaction (the one inserting the attempt), so the stats
+    and prompt_attempts never disagree. Counters are incremented in the database with
+    upserts, which keeps concurrent submissions from the same user from losing updates.
+    
+    Args:
+        attempt (PromptAttempt): The attempt being saved
+    """
+    db.session.flush()  # Fills in the attempt's created_at default
+    user_table = UserStats.__table__
+    question_table = UserQuestionStats.__table__
+    tokens_used = attempt.tokens_used or 0
+    
+    db.session.execute(_upsert(UserStats, {
+        'user_id': attempt.user_id,
+        'total_attempts': 1,
+        'correct_solutions': int(attempt.success),
+        'tokens_used': tokens_used,
+        'last_attempt_at': attempt.created_at
+    }, {
+        'total_attempts': user_table.c.total_attempts + 1,
+        'correct_solutions': user_table.c.correct_solutions + int(attempt.success),
+        'tokens_used': user_table.c.tokens_used + tokens_used,
+        'last_attempt_at': attempt.created_at
+    }))
+    
+    # Replace the best entry only if this attempt ranks higher: score, then tokens, then time
+    improves = or_(
+        question_table.c.best_score < attempt.score,
+        and_(question_table.c.best_score == attempt.score, question_table.c.best_tokens > tokens_used),
+        and_(question_table.c.best_score == attempt.score, question_table.c.best_tokens == tokens_used,
+             question_table.c.best_at > attempt.created_at)
+    )
+    best = {
+        'best_score': attempt.score,
+        'best_tokens': tokens_used,
+        'best_attempt_id': attempt.id,
+        'best_at': attempt.created_at
+    }
+    db.session.execute(_upsert(UserQuestionStats, {
+        'user_id': attempt.user_id,
+        'question_id': attempt.question_id,
+        'attempts': 1,
+        'last_attempt_at': attempt.created_at,
+        **best
+    }, {
+        'attempts': question_table.c.attempts + 1,
+        'last_attempt_at': attempt.created_at,
+        **{column: case((improves, value), else_=question_table.c[column]) for column, value in best.items()}
+    }))
+
+def rebuild_question_stats(question_id=None):
+    """
+    Recompute user_question_stats (and so the leaderboards) from prompt_attempts.
+    
+    Args:
+        question_id (str): Only rebuild this question's rows; all questions if None
+    
+    Returns:
+        int: Number of user/question rows written
+    """
+    group = (PromptAttempt.user_id, PromptAttempt.question_id)
+    ranked = select(
+        PromptAttempt.user_id,
+        PromptAttempt.question_id,
+        func.count(PromptAttempt.id).over(partition_by=group).label('attempts'),
+        PromptAttempt.score,
+        func.coalesce(PromptAttempt.tokens_used, 0).label('tokens_used'),
+        PromptAttempt.id,
+        PromptAttempt.created_at,
+        func.max(PromptAttempt.created_at).over(partition_by=group).label('last_attempt_at'),
+        func.row_number().over(partition_by=group, order_by=(
+            PromptAttempt.score.desc(), func.coalesce(PromptAttempt.tokens_used, 0),
+            PromptAttempt.created_at, PromptAttempt.id
+        )).label('position')
+    )
+    clear = delete(UserQuestionStats)
+    if question_id:
+        ranked = ranked.where(PromptAttempt.question_id == question_id)
+        clear = clear.where(UserQuestionStats.question_id == question_id)
+    ranked = ranked.subquery()
+    best_rows = select(
+        ranked.c.user_id, ranked.c.question_id, ranked.c.attempts, ranked.c.score, ranked.c.tokens_used,
+        ranked.c.id, ranked.c.created_at, ranked.c.last_attempt_at
+    ).where(ranked.c.position == 1)
+    
+    db.session.execute(clear)
+    rows = db.session.execute(insert(UserQuestionStats).from_select(
+        ['user_id', 'question_id', 'attempts', 'best_score', 'best_tokens',
+         'best_attempt_id', 'best_at', 'last_attempt_at'], best_rows
+    )).rowcount
+    return rows
+
+def rebuild_user_stats():
+    """
+    Recompute user_stats and user_question_stats from prompt_attempts.
+    
+    Idempotent; run it once after upgrading (to backfill existing attempts) and after
+    anything that rewrites attempts in bulk, such as regrade.py.
+    
+    Returns:
+        dict: Number of user and user/question rows written
+    """
+    user_totals = select(
+        PromptAttempt.user_id,
+        func.count(PromptAttempt.id),
+        func.sum(case((PromptAttempt.success, 1), else_=0)),
+        func.coalesce(func.sum(PromptAttempt.tokens_used), 0),
+        func.max(PromptAttempt.created_at)
+    ).group_by(PromptAttempt.user_id)
+    
+    db.session.execute(delete(UserStats))
+    users = db.session.execute(insert(UserStats).from_select(
+        ['user_id', 'total_attempts', 'correct_solutions', 'tokens_used', 'last_attempt_at'], user_totals
+    )).rowcount
+    questions = rebuild_question_stats()
+    db.session.commit()
+    leaderboards.clear()
+    return {'users': users, 'user_questions': questions}
+
+@api.cli.command('backfill-stats')
+def backfill_stats_command():
+    """Rebuild per-user stats from prompt_attempts."""
+    counts = rebuild_user_stats()
+    print(f"Rebuilt stats for {counts['users']} users ({counts['user_questions']} user/question rows)")
+
+# Per-question leaderboards, loaded from user_question_stats on first use and then kept
+# current by publish_attempt. The TTL bounds how stale entries from other workers can be.
+leaderboards = LRUCache(
+    max_size=int(os.getenv('LEADERBOARD_CACHE_SIZE', '256')),
+    ttl=int(os.getenv('LEADERBOARD_CACHE_TTL', '30'))
+)
+
+def get_leaderboard(question_id):
+    """Return the in-process leaderboard for a question, loading it if needed."""
+    leaderboard = leaderboards.get(question_id)
+    if leaderboard is None:
+        rows = db.session.query(
+            UserQuestionStats.user_id, User.username, UserQuestionStats.best_score,
+            UserQuestionStats.best_tokens, UserQuestionStats.best_at
+        ).join(User, User.id == UserQuestionStats.user_id)\
+            .filter(UserQuestionStats.question_id == question_id).all()
+        leaderboard = Leaderboard(rows)
+        leaderboards.set(question_id, leaderboard)
+    return leaderboard
+
+def publish_attempt(attempt):
+    """Fold a committed attempt into its question's leaderboard, if that one is loaded."""
+    leaderboard = leaderboards.get(attempt.question_id)
+    if leaderboard is None:
+        return  # Loaded from the table (which already has this attempt) on next use
+    user = get_user_identity(attempt.user_id)
+    leaderboard.offer(
+        attempt.user_id, user['username'] if user else None,
+        attempt.score, attempt.tokens_used or 0, attempt.created_at
+    )
+
+@api.cli.command('rebuild-leaderboards')
+@click.option('--question-id', help='Only rebuild this question\'s leaderboard')
+def rebuild_leaderboards_command(question_id):
+    """Recompute per-question best entries from prompt_attempts."""
+    rows = rebuild_question_stats(question_id)
+    db.session.commit()
+    leaderboards.clear()
+    print(f"Rebuilt {rows} leaderboard entries")
+
+class AttemptIdAllocator:
+    """
+    Hands out prompt_attempts ids before the row is written, so a write-behind
+    submission can return its attempt_id straight away.
+    
+    Ids are reserved in blocks from the table's own PostgreSQL sequence, so they never
+    collide with ids taken by other workers or by direct inserts. Other databases have no
+    sequence that every worker shares, so create_app() only enables write-behind on
+    PostgreSQL.
+    """
+    
+    dialects = ('postgresql',)
+    
+    def __init__(self, block_size=100):
+        self.block_size = block_size
+        self._ids = deque()
+        self._lock = threading.Lock()
+    
+    def allocate(self):
+        with self._lock:
+            if not self._ids:
+                self._ids.extend(self._reserve_block())
+            return self._ids.popleft()
+    
+    def _reserve_block(self):
+        with db.engine.connect() as conn:
+            rows = conn.execute(text(
+                "SELECT nextval(pg_get_serial_sequence('prompt_attempts', 'id')) FROM generate_series(1, :n)"
+            ), {'n': self.block_size})
+            return [row[0] for row in rows]
+
+def flush_attempts(attempts):
+    """
+    Write a batch of buffered attempts and their stats in one transaction.
+    
+    If the batch violates a constraint (e.g. the question was deleted meanwhile), rows are
+    retried one at a time and only the offending ones are dropped; any other error is
+    raised so the write-behind buffer retries the whole batch. A row whose id is already
+    taken is never dropped: see write_colliding_attempt.
+    """
+    with background_app_context():
+        try:
+            db.session.add_all(attempts)
+            for attempt in attempts:
+                record_attempt_stats(attempt)
+            db.session.commit()
+            for attempt in attempts:
+                publish_attempt(attempt)
+            return
+        except IntegrityError as e:
+            db.session.rollback()
+            logging.error(f"Batch insert of {len(attempts)} attempts failed, writing one at a time: {e}")
+        
+        for attempt in attempts:
+            try:
+                db.session.add(attempt)
+                record_attempt_stats(attempt)
+                db.session.commit()
+                publish_attempt(attempt)
+            except IntegrityError as e:
+                db.session.rollback()
+                if not write_colliding_attempt(attempt):
+                    logging.error(f"Dropping attempt {attempt.id} for user {attempt.user_id}: {e}")
+
+def write_colliding_attempt(attempt):
+    """
+    Handle a buffered attempt that failed to insert because its id may already be taken.
+    
+    If the row with that id is this same attempt (an earlier flush committed it), nothing
+    is left to do. If another row holds the id, the attempt is written under a fresh id
+    rather than lost, and the collision is logged, since the client was given the old id.
+    
+    Returns:
+        bool: False if the id is free, i.e. the failure was some other constraint
+    """
+    existing = db.session.execute(
+        select(PromptAttempt.user_id, PromptAttempt.question_id, PromptAttempt.created_at)
+        .where(PromptAttempt.id == attempt.id)
+    ).first()
+    db.session.commit()
+    if existing is None:
+        return False
+    if tuple(existing) == (attempt.user_id, attempt.question_id, attempt.created_at):
+        return True
+    
+    old_id = attempt.id
+    attempt.id = attempt_id_allocator.allocate()
+    db.session.add(attempt)
+    record_attempt_stats(attempt)
+    db.session.commit()
+    publish_attempt(attempt)
+    logging.error(f"Attempt id {old_id} was already taken; saved user {attempt.user_id}'s attempt as {attempt.id}")
+    return True
+
+# Optional write-behind for attempts: submissions return once the attempt is buffered and a
+# background flusher bulk-inserts batches. Buffered rows are lost if the process is killed
+# before they are flushed; a graceful shutdown drains them. The buffer is created by
+# create_app(), and only on databases AttemptIdAllocator supports.
+ATTEMPT_WRITE_BEHIND = os.getenv('ATTEMPT_WRITE_BEHIND', 'false').lower() == 'true'
+attempt_id_allocator = AttemptIdAllocator(block_size=int(os.getenv('ATTEMPT_ID_BLOCK_SIZE', '100')))
+attempt_writer = None
+# Seconds a submission waits for room in a full buffer before writing its attempt itself
+ATTEMPT_PENDING_WAIT = float(os.getenv('ATTEMPT_PENDING_WAIT', '1'))
+ATTEMPT_DRAIN_TIMEOUT = float(os.getenv('ATTEMPT_DRAIN_TIMEOUT', '30'))
+
+# Evaluations running outside the job pool (streams), so a graceful shutdown can wait for them
+evaluations_in_flight = InflightTracker()
+
+def evaluate_submission(user_id, question, user_prompt, bypass_cache=False, on_result=None, batch=False):
+    """
+    Evaluate a prompt against all of a question's test cases and save the attempt.
+    
+    Args:
+        user_id (int): The submitting user's id
+        question (Question): The question being attempted
+        user_prompt (str): The prompt submitted by the user
+        bypass_cache (bool): Skip the LLM response cache for every case
+        on_result (callable): Optional callback invoked with each test case result as it finishes
+        batch (bool): Send all test cases in one LLM call, falling back to per-case calls
+    
+    Returns:
+        dict: Submission result as returned by /submit-prompt
+    """
+    deadline = time.monotonic() + SUBMISSION_DEADLINE
+    validator = get_question_validator(question)
+    question_id, test_cases = question.id, question.test_cases
+    # End the read transaction so the pooled connection isn't held while waiting on the LLM
+    db.session.commit()
+    test_case_results, tokens_used, batch_info = run_test_cases_batched(
+        user_prompt, test_cases, bypass_cache, on_result, deadline, validator
+    ) if batch else (None, 0, None)
+    if test_case_results is not None:
+        # Leaderboards rank by tokens, and one combined call isn't comparable with per-case
+        # calls, so the attempt records the per-case equivalent: the call's tokens plus the
+        # prompt tokens that batching saved
+        batch_info['call_tokens'] = tokens_used
+        tokens_used += batch_info['estimated_tokens_saved']
+    else:
+        failed_call_tokens = tokens_used
+        if batch:
+            # The failed batched call was paid for too, so the attempt counts it
+            batch_info = {'mode': 'fallback', 'estimated_tokens_saved': 0, 'call_tokens': failed_call_tokens}
+        # Test the prompt against each test case concurrently; results keep test-case order
+        test_case_results, tokens_used = run_test_cases(
+            user_prompt, test_cases, bypass_cache, on_result, deadline, validator
+        )
+        tokens_used += failed_call_tokens
+    passed_cases = sum(1 for result in test_case_results if result['passed'])
+    total_cases = len(test_cases)
+    
+    # Calculate overall results
+    overall_score = passed_cases / total_cases if total_cases > 0 else 0.0
+    overall_passed = overall_score == 1.0
+    
+    # Save attempt to database (using first test case for storage)
+    first_test_case = test_cases[0]
+    first_result = test_case_results[0]
+    
+    # Ensure we have a valid response to save
+    llm_response_to_save = first_result['actual_output']
+    if llm_response_to_save is None:
+        llm_response_to_save = "No valid response generated"
+    elif isinstance(llm_response_to_save, (dict, list)):
+        llm_response_to_save = json.dumps(llm_response_to_save)
+
+    dataset_to_save = first_test_case['input']
+    if isinstance(dataset_to_save, (dict, list)):
+        dataset_to_save = json.dumps(dataset_to_save)
+
+    expected_output_to_save = first_test_case['expected_output']
+    if isinstance(expected_output_to_save, (dict, list)):
+        expected_output_to_save = json.dumps(expected_output_to_save)
+
+    attempt = PromptAttempt(
+        user_id=user_id,
+        question_id=question_id,
+        user_prompt=user_prompt,
+        dataset=dataset_to_save,
+        expected_output=expected_output_to_save,
+        llm_response=llm_response_to_save,
+        score=overall_score,
+        success=overall_passed,
+        model=LLM_MODEL,
+        tokens_used=tokens_used
+    )
+    with stage_timer.time('persistence'):
+        buffered = False
+        if attempt_writer is not None:
+            # Id and timestamp are fixed now so the response doesn't wait for the flush
+            attempt.id = attempt_id_allocator.allocate()
+            attempt.created_at = datetime.utcnow()
+            try:
+                attempt_writer.put(attempt, timeout=ATTEMPT_PENDING_WAIT)
+                buffered = True
+            except BufferFull as e:
+                # The flusher is behind (or the database is down): write this one directly, so
+                # memory stays bounded and an outage fails the request instead of hiding it
+                logging.warning(f"{e}; writing attempt synchronously")
+        if not buffered:
+            db.session.add(attempt)
+            record_attempt_stats(attempt)
+            db.session.commit()
+            publish_attempt(attempt)
+    
+    result = {
+        'success': overall_passed,
+        'score': overall_score,
+        'passed_cases': passed_cases,
+        'total_cases': total_cases,
+        'test_case_results': test_case_results,
+        'format_issues': [],
+        'attempt_id': attempt.id,
+        'created_at': attempt.created_at.isoformat()
+    }
+    if batch_info:
+        result['batch'] = batch_info
+    return result
+
+# A running job whose row hasn't been touched for this long is assumed lost with its worker.
+# Progress is recorded after every test case, so a live job is never idle much past the deadline.
+JOB_STALE_AFTER = float(os.getenv('JOB_STALE_AFTER', str(2 * SUBMISSION_DEADLINE)))
+JOB_INTERRUPTED_ERROR = 'Job was interrupted before it finished (worker stopped); please resubmit'
+
+def claim_submission_job(job_id):
+    """Atomically move a job from queued to running; False if it is gone or another worker has it."""
+    claimed = db.session.execute(
+        update(SubmissionJob)
+        .where(SubmissionJob.id == job_id, SubmissionJob.status == 'queued')
+        .values(status='running', updated_at=datetime.utcnow())
+    ).rowcount
+    db.session.commit()
+    return claimed == 1
+
+def run_submission_job(job_id):
+    """Worker entry point: evaluate a queued submission and record progress on its job row."""
+    with background_app_context():
+        # The same job can be queued by two workers after a restart; only one runs it
+        if not claim_submission_job(job_id):
+            logging.info(f"Submission job {job_id} is missing or already claimed")
+            return
+        job = SubmissionJob.query.get(job_id)
+        
+        try:
+            question = Question.query.get(job.question_id)
+            if not question:
+                raise ValueError('Question not found')
+            
+            def record_progress(result):
+                job.completed_cases += 1
+                job.updated_at = datetime.utcnow()
+                db.session.commit()
+            
+            job.result = evaluate_submission(
+                job.user_id, question, job.user_prompt, job.bypass_cache,
+                on_result=record_progress, batch=job.batch
+            )
+            job.status = 'completed'
+        except Exception as e:
+            logging.error(f"Error in submission job {job_id}: {e}")
+            db.session.rollback()
+            job.status = 'failed'
+            job.error = str(e)
+        
+        job.updated_at = datetime.utcnow()
+        db.session.commit()
+
+# Background workers for job-mode submissions, scheduled round-robin per user
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '4'))
+job_pool = JobWorkerPool(run_submission_job, num_workers=JOB_WORKERS, name='submission-job')
+
+def fail_stale_jobs(job_id=None):
+    """Mark running jobs that stopped making progress as failed; returns how many were."""
+    cutoff = datetime.utcnow() - timedelta(seconds=JOB_STALE_AFTER)
+    query = update(SubmissionJob).where(SubmissionJob.status == 'running', SubmissionJob.updated_at < cutoff)
+    if job_id is not None:
+        query = query.where(SubmissionJob.id == job_id)
+    failed = db.session.execute(
+        query.values(status='failed', error=JOB_INTERRUPTED_ERROR, updated_at=datetime.utcnow())
+    ).rowcount
+    db.session.commit()
+    return failed
+
+def recover_submission_jobs():
+    """
+    Pick up jobs a previous process left behind (crash, deploy, or a shutdown that timed out).
+    
+    Queued jobs only lived in that process's memory, so they are queued again here; a job
+    queued by more than one worker is still run once (see claim_submission_job). Running
+    jobs that have gone stale are marked failed. Runs in the current app context.
+    
+    Returns:
+        dict: Counts of requeued and failed jobs
+    """
+    failed = fail_stale_jobs()
+    queued = db.session.query(SubmissionJob.id, SubmissionJob.user_id).filter(
+        SubmissionJob.status == 'queued'
+    ).order_by(SubmissionJob.created_at).all()
+    db.session.commit()
+    for job_id, user_id in queued:
+        job_pool.submit(user_id, job_id)
+    if queued or failed:
+        logging.info(f"Recovered submission jobs: {len(queued)} requeued, {failed} marked failed")
+    return {'requeued': len(queued), 'failed': failed}
+
+_jobs_recovered = False
+_jobs_recovered_lock = threading.Lock()
+
+@api.before_app_request
+def recover_jobs_once():
+    # Only processes that serve requests pick up leftover jobs (not CLI commands or scripts)
+    global _jobs_recovered
+    if _jobs_recovered:
+        return
+    with _jobs_recovered_lock:
+        if _jobs_recovered:
+            return
+        _jobs_recovered = True
+        try:
+            recover_submission_jobs()
+        except Exception as e:
+            logging.error(f"Submission job recovery failed: {e}")
+            db.session.rollback()
+
+@api.route('/submit-prompt', methods=['POST'])
 @jwt_required()
 def submit_prompt():
     data = request.get_json()
@@ -385,307 +1346,709 @@ def submit_prompt():
     try:
         question_id = data['question_id']
         user_prompt = data['user_prompt']
+        bypass_cache = bool(data.get('bypass_cache', False))
+        batch = bool(data.get('batch', False))
         
-        print(f"Received prompt from UI: {user_prompt}")  # DEBUG LOG
+        logging.debug(f"Received prompt from UI: {user_prompt}")
         
         # Get the question
-        question = Question.query.get(question_id)
+        with stage_timer.time('question_load'):
+            question = Question.query.get(question_id)
         if not question:
             return jsonify({'error': 'Question not found'}), 404
         
-        # Test the prompt against each test case separately
-        test_case_results = []
-        passed_cases = 0
-        total_cases = len(question.test_cases)
-        
-        for i, test_case in enumerate(question.test_cases):
-            test_input = test_case['input']
-            
-            # Combine user prompt with this specific test case input
-            full_prompt = f"{user_prompt}\n\nDataset:\n{json.dumps(test_input, indent=2)}"
-            
-            # Send to OpenAI
-            try:
-                response = client.chat.completions.create(
-                    model="gpt-4o",
-                    messages=[
-                        {"role": "user", "content": full_prompt}
-                    ],
-                    temperature=0,
-                    max_tokens=1000
-                )
-                model_response = response.choices[0].message.content
-                tokens_used = response.usage.total_tokens
-            except Exception as e:
-                return jsonify({'error': f'OpenAI API error: {str(e)}'}), 500
-            
-            # Validate this specific response against this test case
-            validation_result = validate_single_test_case(model_response, test_case)
-            
-            test_case_results.append({
-                'test_case_id': i + 1,
-                'input': test_input,
-                'expected_output': test_case['expected_output'],
-                'actual_output': validation_result['parsed_response'],
-                'passed': validation_result['pass'],
-                'score': validation_result['score'],
-                'missing_entries': validation_result['missing_entries'],
-                'extra_entries': validation_result['extra_entries']
-            })
+        # Job mode: queue the evaluation and let the client poll /jobs/<id>
+        if data.get('async'):
+            job = SubmissionJob(
+                id=str(uuid.uuid4()),
+                user_id=user_id,
+                question_id=question_id,
+                user_prompt=user_prompt,
+                bypass_cache=bypass_cache,
+                batch=batch,
+                total_cases=len(question.test_cases)
+            )
+            db.session.add(job)
+            db.session.commit()
+            job_pool.submit(user_id, job.id)
             
-            if validation_result['pass']:
-                passed_cases += 1
+            return jsonify({'job_id': job.id, 'status': job.status}), 202
         
-        # Calculate overall results
-        overall_score = passed_cases / total_cases if total_cases > 0 else 0.0
-        overall_passed = overall_score == 1.0
-        
-        # Save attempt to database (using first test case for storage)
-        first_test_case = question.test_cases[0]
-        first_result = test_case_results[0]
-        
-        # Ensure we have a valid response to save
-        llm_response_to_save = first_result['actual_output']
-        if llm_response_to_save is None:
-            llm_response_to_save = "No valid response generated"
-        elif isinstance(llm_response_to_save, (dict, list)):
-            llm_response_to_save = json.dumps(llm_response_to_save)
-
-        dataset_to_save = first_test_case['input']
-        if isinstance(dataset_to_save, (dict, list)):
-            dataset_to_save = json.dumps(dataset_to_save)
-
-        expected_output_to_save = first_test_case['expected_output']
-        if isinstance(expected_output_to_save, (dict, list)):
-            expected_output_to_save = json.dumps(expected_output_to_save)
-
-        attempt = PromptAttempt(
-            user_id=user_id,
-            question_id=question_id,
-            user_prompt=user_prompt,
-            dataset=dataset_to_save,
-            expected_output=expected_output_to_save,
-            llm_response=llm_response_to_save,
-            score=overall_score,
-            success=overall_passed,
-            model="gpt-4o",
-            tokens_used=tokens_used
-        )
-        db.session.add(attempt)
-        db.session.commit()
-        
-        return jsonify({
-            'success': overall_passed,
-            'score': overall_score,
-            'passed_cases': passed_cases,
-            'total_cases': total_cases,
-            'test_case_results': test_case_results,
-            'format_issues': [],
-            'attempt_id': attempt.id,
-            'created_at': attempt.created_at.isoformat()
-        })
+        result = evaluate_submission(user_id, question, user_prompt, bypass_cache, batch=batch)
+        if data.get('timings'):
+            result['timings'] = g.request_timings.as_dict()
+        return jsonify(result)
         
     except Exception as e:
         logging.error(f"Error in submit_prompt: {e}")
         return jsonify({'error': f'Internal server error: {str(e)}'}), 500
 
-@app.route('/get-question/<question_id>', methods=['GET'])
+def format_sse(event, data):
+    """Format a Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@api.route('/submit-prompt/stream', methods=['POST'])
+@jwt_required()
+def submit_prompt_stream():
+    """
+    Streaming variant of /submit-prompt.
+    
+    Sends one `test_case` SSE event per test case as soon as it has been evaluated,
+    then a `summary` event with the overall score and attempt id (or an `error` event).
+    """
+    data = request.get_json()
+    user_id = int(get_jwt_identity())
+    
+    if not data or not data.get('question_id') or not data.get('user_prompt'):
+        return jsonify({'error': 'Missing required fields: question_id, user_prompt'}), 400
+    
+    question_id = data['question_id']
+    user_prompt = data['user_prompt']
+    bypass_cache = bool(data.get('bypass_cache', False))
+    batch = bool(data.get('batch', False))
+    
+    with stage_timer.time('question_load'):
+        question = Question.query.get(question_id)
+    if not question:
+        return jsonify({'error': 'Question not found'}), 404
+    total_cases = len(question.test_cases)
+    # The request's session lives until the stream closes; don't keep its connection checked out
+    db.session.commit()
+    
+    events = queue.Queue()
+    timings = g.request_timings
+    
+    def evaluate():
+        # Runs off the request thread so events can be flushed while cases are still in flight
+        try:
+            with background_app_context(), evaluations_in_flight.track():
+                streamed_question = Question.query.get(question_id)
+                result = evaluate_submission(
+                    user_id, streamed_question, user_prompt, bypass_cache,
+                    on_result=lambda case_result: events.put(('test_case', case_result)),
+                    batch=batch
+                )
+                events.put(('summary', {
+                    'success': result['success'],
+                    'score': result['score'],
+                    'passed_cases': result['passed_cases'],
+                    'total_cases': result['total_cases'],
+                    'format_issues': result['format_issues'],
+                    'attempt_id': result['attempt_id'],
+                    'created_at': result['created_at'],
+                    'batch': result.get('batch'),
+                    **({'timings': timings.as_dict()} if data.get('timings') else {})
+                }))
+        except Exception as e:
+            logging.error(f"Error in submit_prompt_stream: {e}")
+            events.put(('error', {'error': f'Internal server error: {str(e)}'}))
+    
+    # Run in a copy of this request's context so stage timings land in its breakdown
+    threading.Thread(
+        target=contextvars.copy_context().run, args=(evaluate,), name='submit-stream', daemon=True
+    ).start()
+    
+    # The evaluation gives up at the submission deadline; allow a little more for saving the
+    # attempt, then stop waiting so a lost evaluation thread can't hold this request forever
+    stream_deadline = time.monotonic() + SUBMISSION_DEADLINE + 10
+    
+    def generate():
+        yield format_sse('start', {'question_id': question_id, 'total_cases': total_cases})
+        while True:
+            try:
+                event, payload = events.get(timeout=max(0.0, stream_deadline - time.monotonic()))
+            except queue.Empty:
+                logging.error(f"Streamed evaluation for user {user_id} sent nothing before the deadline")
+                yield format_sse('error', {'error': 'Evaluation did not finish before the submission deadline'})
+                break
+            yield format_sse(event, payload)
+            if event in ('summary', 'error'):
+                break
+    
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # Stop nginx from buffering the stream
+    })
+
+@api.route('/jobs/<job_id>', methods=['GET'])
+@jwt_required()
+def get_job(job_id):
+    """Get the progress and, once finished, the result of a queued submission."""
+    user_id = int(get_jwt_identity())
+    job = SubmissionJob.query.get(job_id)
+    
+    if not job or job.user_id != user_id:
+        return jsonify({'error': 'Job not found'}), 404
+    if job.status == 'running' and fail_stale_jobs(job.id):
+        # Its worker died mid-run; report that instead of "running" forever
+        db.session.refresh(job)
+    
+    return jsonify({
+        'job_id': job.id,
+        'status': job.status,
+        'question_id': job.question_id,
+        'completed_cases': job.completed_cases,
+        'total_cases': job.total_cases,
+        'pending_jobs': job_pool.queue.pending(user_id),
+        'result': job.result,
+        'error': job.error,
+        'created_at': job.created_at.isoformat(),
+        'updated_at': job.updated_at.isoformat()
+    })
+
+class QuestionBankVersion:
+    """
+    Version stamp for the question bank, used to invalidate cached question payloads.
+    
+    Writes in this process bump a local generation immediately (via ORM events). Writes
+    made by other workers are picked up from a cheap count/max(updated_at) query that
+    runs at most once every check_interval seconds.
+    """
+    
+    def __init__(self, check_interval=5.0):
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._db_stamp = None
+        self._checked_at = 0.0
+    
+    def bump(self):
+        with self._lock:
+            self._generation += 1
+            self._checked_at = 0.0
+    
+    def current(self):
+        now = time.monotonic()
+        with self._lock:
+            stale = now - self._checked_at > self.check_interval
+        if stale:
+            count, last_changed = db.session.query(
+                func.count(Question.id),
+                func.max(func.coalesce(Question.updated_at, Question.created_at))
+            ).one()
+            with self._lock:
+                self._db_stamp = (count, last_changed)
+                self._checked_at = now
+        with self._lock:
+            return self._generation, self._db_stamp
+
+question_bank_version = QuestionBankVersion(float(os.getenv('QUESTION_VERSION_CHECK_INTERVAL', '5')))
+question_payload_cache = LRUCache(max_size=int(os.getenv('QUESTION_CACHE_SIZE', '1024')), ttl=float('inf'))
+
+@event.listens_for(Question, 'after_insert')
+@event.listens_for(Question, 'after_update')
+@event.listens_for(Question, 'after_delete')
+def invalidate_question_payloads(mapper, connection, target):
+    question_bank_version.bump()
+
+def cached_question_response(cache_key, build_payload):
+    """
+    Serve a question payload from the read-through cache with a strong ETag.
+    
+    Args:
+        cache_key (str): Identifies the payload (endpoint and arguments)
+        build_payload (callable): Returns the payload dict, or None if it doesn't exist
+    
+    Returns:
+        Response: 200 with the payload, 304 if the client's If-None-Match matches, or None if build_payload returned None
+    """
+    version = question_bank_version.current()
+    cached = question_payload_cache.get(cache_key)
+    if cached is None or cached[0] != version:
+        payload = build_payload()
+        if payload is None:
+            return None
+        body = jsonify(payload).get_data()
+        cached = (version, body, hashlib.sha256(body).hexdigest())
+        question_payload_cache.set(cache_key, cached)
+    
+    _, body, etag = cached
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    # Let browsers and the CDN keep a copy but revalidate it on every use
+    response.headers['Cache-Control'] = 'public, no-cache'
+    return response.make_conditional(request)
+
+def serialize_question(question):
+    return {
+        'id': question.id,
+        'title': question.title,
+        'description': question.description,
+        'test_cases': question.test_cases,
+        'difficulty': question.difficulty,
+        'category': question.category,
+        'created_at': question.created_at.isoformat()
+    }
+
+@api.route('/get-question/<question_id>', methods=['GET'])
 def get_question(question_id):
     """Get question details by ID."""
     try:
-        question = Question.query.get(question_id)
-        if not question:
-            return jsonify({'error': 'Question not found'}), 404
+        def build_payload():
+            question = Question.query.get(question_id)
+            return serialize_question(question) if question else None
         
-        return jsonify({
-            'id': question.id,
-            'title': question.title,
-            'description': question.description,
-            'test_cases': question.test_cases,
-            'difficulty': question.difficulty,
-            'category': question.category,
-            'created_at': question.created_at.isoformat()
-        })
+        response = cached_question_response(f'question:{question_id}', build_payload)
+        if response is None:
+            return jsonify({'error': 'Question not found'}), 404
+        return response
         
     except Exception as e:
         logging.error(f"Error in get_question: {e}")
         return jsonify({'error': f'Internal server error: {str(e)}'}), 500
 
-@app.route('/get-results/<user_id>', methods=['GET'])
+# Attempt listings page newest-first on (created_at, id); large text columns are opt-in
+ATTEMPT_TEXT_FIELDS = ('user_prompt', 'llm_response')
+ATTEMPTS_MAX_PAGE_SIZE = 100
+
+def encode_attempt_cursor(created_at, attempt_id):
+    return f'{created_at.isoformat()}_{attempt_id}'
+
+def decode_attempt_cursor(cursor):
+    """Parse a cursor from encode_attempt_cursor; raises ValueError if it is malformed."""
+    created_at, attempt_id = cursor.rsplit('_', 1)
+    return datetime.fromisoformat(created_at), int(attempt_id)
+
+def parse_attempt_page_args(allowed_fields, default_limit=10):
+    """
+    Read the shared paging params of the attempt listings.
+    
+    Returns:
+        tuple: (limit, cursor position or None, requested text fields, include_total)
+    
+    Raises:
+        ValueError: If the cursor or fields are invalid
+    """
+    limit = request.args.get('limit', request.args.get('per_page', default_limit, type=int), type=int)
+    limit = max(1, min(limit, ATTEMPTS_MAX_PAGE_SIZE))
+    cursor = request.args.get('cursor')
+    position = decode_attempt_cursor(cursor) if cursor else None
+    fields = [field for field in request.args.get('fields', '').split(',') if field]
+    unknown_fields = [field for field in fields if field not in allowed_fields]
+    if unknown_fields:
+        raise ValueError(f'Unknown fields: {", ".join(unknown_fields)}')
+    include_total = request.args.get('include_total', 'false').lower() == 'true'
+    return limit, position, fields, include_total
+
+def page_user_attempts(query, user_id, limit, position):
+    """
+    Apply the user filter and keyset paging to a query over prompt_attempts.
+    
+    Walks idx_prompt_attempts_user_created (user_id, created_at DESC, id DESC), so each
+    page costs the same however deep it is.
+    
+    Returns:
+        tuple: (rows for this page, next_cursor or None)
+    """
+    query = query.filter(PromptAttempt.user_id == user_id)
+    if position:
+        query = query.filter(tuple_(PromptAttempt.created_at, PromptAttempt.id) < tuple_(*position))
+    rows = query.order_by(PromptAttempt.created_at.desc(), PromptAttempt.id.desc()).limit(limit + 1).all()
+    
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = None
+    if has_more:
+        last = rows[-1]
+        next_cursor = encode_attempt_cursor(last.created_at, last.id)
+    return rows, next_cursor
+
+def user_attempt_total(user_id):
+    # Maintained alongside every insert (see record_attempt_stats), so no COUNT(*) is needed
+    stats = db.session.get(UserStats, user_id)
+    return stats.total_attempts if stats else 0
+
+@api.route('/get-results/<user_id>', methods=['GET'])
 def get_results(user_id):
-    """Get all attempts for a specific user."""
+    """
+    Get a user's attempts, newest first, one keyset-paginated page at a time.
+    
+    Query params: limit (default 10; per_page is accepted too), cursor (next_cursor of
+    the previous page), fields (user_prompt and/or llm_response, omitted by default)
+    and include_total.
+    """
     try:
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 10, type=int)
+        user_id = int(user_id)
+        try:
+            limit, position, fields, include_total = parse_attempt_page_args(ATTEMPT_TEXT_FIELDS)
+        except ValueError as e:
+            return jsonify({'error': f'Invalid paging parameters: {str(e)}'}), 400
         
-        attempts = PromptAttempt.query.filter_by(user_id=user_id)\
-            .order_by(PromptAttempt.created_at.desc())\
-            .paginate(page=page, per_page=per_page, error_out=False)
+        columns = [
+            PromptAttempt.id, PromptAttempt.question_id, PromptAttempt.score, PromptAttempt.success,
+            PromptAttempt.model, PromptAttempt.tokens_used, PromptAttempt.created_at
+        ] + [getattr(PromptAttempt, field) for field in fields]
+        rows, next_cursor = page_user_attempts(db.session.query(*columns), user_id, limit, position)
         
         results = []
-        for attempt in attempts.items:
-            results.append({
-                'id': attempt.id,
-                'question_id': attempt.question_id,
-                'user_prompt': attempt.user_prompt,
-                'llm_response': attempt.llm_response,
-                'score': attempt.score,
-                'success': attempt.success,
-                'model': attempt.model,
-                'tokens_used': attempt.tokens_used,
-                'created_at': attempt.created_at.isoformat()
-            })
+        for row in rows:
+            result = {
+                'id': row.id,
+                'question_id': row.question_id,
+                'score': row.score,
+                'success': row.success,
+                'model': row.model,
+                'tokens_used': row.tokens_used,
+                'created_at': row.created_at.isoformat()
+            }
+            for field in fields:
+                result[field] = getattr(row, field)
+            results.append(result)
         
-        return jsonify({
+        response = {
             'results': results,
-            'total': attempts.total,
-            'pages': attempts.pages,
-            'current_page': page,
-            'per_page': per_page
-        })
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None,
+            'per_page': limit
+        }
+        if include_total:
+            response['total'] = user_attempt_total(user_id)
+        return jsonify(response)
         
     except Exception as e:
         logging.error(f"Error in get_results: {e}")
         return jsonify({'error': f'Internal server error: {str(e)}'}), 500
 
-@app.route('/questions', methods=['GET'])
+LEADERBOARD_MAX_SIZE = 100
+
+@api.route('/leaderboard/<question_id>', methods=['GET'])
+@jwt_required(optional=True)
+def get_question_leaderboard(question_id):
+    """
+    Top entries for a question: each user's best attempt, ranked by score, then fewest
+    tokens, then earliest. With a JWT the caller's own entry and rank are included as 'me'.
+    
+    Query params: limit (default 10, max 100)
+    """
+    try:
+        limit = max(1, min(request.args.get('limit', 10, type=int), LEADERBOARD_MAX_SIZE))
+        leaderboard = get_leaderboard(question_id)
+        
+        response = {
+            'question_id': question_id,
+            'entries': leaderboard.top(limit),
+            'participants': len(leaderboard)
+        }
+        identity = get_jwt_identity()
+        if identity is not None:
+            response['me'] = leaderboard.rank(int(identity))
+        return jsonify(response)
+        
+    except Exception as e:
+        logging.error(f"Error in get_question_leaderboard: {e}")
+        return jsonify({'error': f'Internal server error: {str(e)}'}), 500
+
+# Columns always returned by /questions, and heavier ones clients can opt into with fields=
+QUESTION_SUMMARY_FIELDS = ('id', 'title', 'difficulty', 'category')
+QUESTION_OPTIONAL_FIELDS = ('description', 'test_cases', 'created_at')
+QUESTIONS_MAX_PAGE_SIZE = 200
+
+@api.route('/questions', methods=['GET'])
 def list_questions():
-    """List all available questions."""
+    """
+    List questions, one keyset-paginated page at a time.
+    
+    Query params: difficulty, category, limit (default 50), cursor (next_cursor of the
+    previous page) and fields (comma-separated extras: description, test_cases, created_at).
+    Only the requested columns are loaded; test_cases is never read unless asked for.
+    """
     try:
-        questions = Question.query.all()
-        results = []
-        for question in questions:
-            results.append({
-                'id': question.id,
-                'title': question.title,
-                'description': question.description,
-                'test_cases': question.test_cases,
-                'difficulty': question.difficulty,
-                'category': question.category
-            })
+        difficulty = request.args.get('difficulty')
+        category = request.args.get('category')
+        cursor = request.args.get('cursor')
+        limit = max(1, min(request.args.get('limit', 50, type=int), QUESTIONS_MAX_PAGE_SIZE))
+        fields = [field for field in request.args.get('fields', '').split(',') if field]
         
-        return jsonify({'questions': results})
+        unknown_fields = [field for field in fields if field not in QUESTION_OPTIONAL_FIELDS]
+        if unknown_fields:
+            return jsonify({'error': f'Unknown fields: {", ".join(unknown_fields)}'}), 400
+        columns = list(QUESTION_SUMMARY_FIELDS) + [field for field in QUESTION_OPTIONAL_FIELDS if field in fields]
+        
+        def build_payload():
+            query = Question.query.options(load_only(*[getattr(Question, column) for column in columns]))
+            if difficulty:
+                query = query.filter(Question.difficulty == difficulty)
+            if category:
+                query = query.filter(Question.category == category)
+            if cursor:
+                query = query.filter(Question.id > cursor)
+            questions = query.order_by(Question.id).limit(limit + 1).all()
+            
+            has_more = len(questions) > limit
+            questions = questions[:limit]
+            results = []
+            for question in questions:
+                result = {column: getattr(question, column) for column in columns}
+                if 'created_at' in result:
+                    result['created_at'] = result['created_at'].isoformat()
+                results.append(result)
+            
+            return {
+                'questions': results,
+                'next_cursor': questions[-1].id if has_more else None,
+                'has_more': has_more
+            }
+        
+        cache_key = f'questions:{difficulty}:{category}:{cursor}:{limit}:{",".join(columns)}'
+        return cached_question_response(cache_key, build_payload)
         
     except Exception as e:
         logging.error(f"Error in list_questions: {e}")
         return jsonify({'error': f'Internal server error: {str(e)}'}), 500
 
-@app.route('/health', methods=['GET'])
+@api.before_app_request
+def start_request_metrics():
+    g.request_timings = start_request_timings()
+
+@api.after_app_request
+def record_request_metrics(response):
+    timings = getattr(g, 'request_timings', None)
+    if timings is None:
+        return response
+    # Route patterns rather than raw paths keep the label set bounded
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    elapsed = timings.as_dict()['total_ms'] / 1000
+    http_requests.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+    http_latency.observe(elapsed, endpoint=endpoint)
+    if request.args.get('timings') == 'true':
+        response.headers['Server-Timing'] = timings.server_timing()
+    return response
+
+metrics.gauge('llm_leetcode_llm_cache_entries', 'Entries in the in-process LLM response cache', lambda: len(response_cache))
+metrics.gauge('llm_leetcode_llm_inflight', 'Distinct LLM calls in flight in this process', lambda: singleflight.stats()['in_flight'])
+metrics.gauge('llm_leetcode_jobs_pending', 'Queued job-mode submissions not yet started', lambda: job_pool.queue.pending())
+metrics.gauge(
+    'llm_leetcode_attempt_writes_pending', 'Attempts accepted but not yet written to the database',
+    lambda: attempt_writer.pending() if attempt_writer is not None else 0
+)
+
+@api.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus metrics for this process."""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@api.route('/cache-stats', methods=['GET'])
+def get_cache_stats():
+    """LLM response cache hit/miss counters for this process."""
+    stats = cache_stats.snapshot()
+    stats['memory_entries'] = len(response_cache)
+    stats['enabled'] = LLM_CACHE_ENABLED
+    stats['singleflight'] = singleflight.stats()
+    stats['singleflight']['cross_worker'] = inflight_locks is not None
+    return jsonify(stats)
+
+@api.route('/rate-limit', methods=['GET'])
+def get_rate_limit():
+    """Current usage of the shared LLM request/token budget."""
+    return jsonify(rate_limiter.usage())
+
+@api.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint."""
-    return jsonify({'status': 'healthy', 'timestamp': datetime.utcnow().isoformat()})
-
-# Initialize database and create sample questions
-def init_db():
-    """Initialize database and create sample questions."""
-    with app.app_context():
-        db.create_all()
-        
-        # Check if we already have questions
-        if Question.query.count() == 0:
-            # Create sample questions
-            sample_questions = [
-                {
-                    'id': 'q1_employee_salary',
-                    'title': 'Employee Salary Filter',
-                    'description': '''Return the names and employee_id of people who earn more than 100k in the format {name: ..., employee_id: ...}.
+    health = {'status': 'healthy', 'timestamp': datetime.utcnow().isoformat()}
+    if attempt_writer is not None:
+        # Attempts accepted but not yet durable in the database, against the buffer's limit
+        health['attempt_writes'] = attempt_writer.stats()
+        if health['attempt_writes']['pending'] >= attempt_writer.max_pending:
+            health['status'] = 'degraded'
+    return jsonify(health)
+
+# Sample questions seeded by init-db
+SAMPLE_QUESTIONS = [
+    {
+        'id': 'q1_employee_salary',
+        'title': 'Employee Salary Filter',
+        'description': '''Return the names and employee_id of people who earn more than 100k in the format {name: ..., employee_id: ...}.
 
 This question tests your ability to filter data based on a condition and extract specific fields.''',
-                    'test_cases': [
-                        {
-                            'input': [
-                                {"name": "John Smith", "employee_id": "EMP001", "salary": 95000, "department": "Engineering"},
-                                {"name": "Sarah Johnson", "employee_id": "EMP002", "salary": 120000, "department": "Sales"},
-                                {"name": "Mike Davis", "employee_id": "EMP003", "salary": 85000, "department": "Marketing"},
-                                {"name": "Lisa Wilson", "employee_id": "EMP004", "salary": 150000, "department": "Engineering"}
-                            ],
-                            'expected_output': [
-                                {"name": "Sarah Johnson", "employee_id": "EMP002"},
-                                {"name": "Lisa Wilson", "employee_id": "EMP004"}
-                            ]
-                        },
-                        {
-                            'input': [
-                                {"name": "Alice Brown", "employee_id": "EMP005", "salary": 75000, "department": "HR"},
-                                {"name": "Bob Green", "employee_id": "EMP006", "salary": 110000, "department": "Engineering"},
-                                {"name": "Carol White", "employee_id": "EMP007", "salary": 95000, "department": "Marketing"}
-                            ],
-                            'expected_output': [
-                                {"name": "Bob Green", "employee_id": "EMP006"}
-                            ]
-                        },
-                        {
-                            'input': [
-                                {"name": "David Black", "employee_id": "EMP008", "salary": 85000, "department": "Sales"},
-                                {"name": "Eva Red", "employee_id": "EMP009", "salary": 92000, "department": "Engineering"}
-                            ],
-                            'expected_output': []
-                        },
-                        {
-                            'input': [
-                                {"name": "Frank Blue", "employee_id": "EMP010", "salary": 100000, "department": "Engineering"},
-                                {"name": "Grace Yellow", "employee_id": "EMP011", "salary": 100001, "department": "Sales"}
-                            ],
-                            'expected_output': [
-                                {"name": "Grace Yellow", "employee_id": "EMP011"}
-                            ]
-                        }
-                    ],
-                    'difficulty': 'easy',
-                    'category': 'data_extraction'
-                },
-                {
-                    'id': 'q2_sales_report',
-                    'title': 'Sales Report Analysis',
-                    'description': '''Extract all sales representatives mentioned in the text along with their sales amounts in the format {name: ..., sales_amount: ...}.
+        'test_cases': [
+            {
+                'input': [
+                    {"name": "John Smith", "employee_id": "EMP001", "salary": 95000, "department": "Engineering"},
+                    {"name": "Sarah Johnson", "employee_id": "EMP002", "salary": 120000, "department": "Sales"},
+                    {"name": "Mike Davis", "employee_id": "EMP003", "salary": 85000, "department": "Marketing"},
+                    {"name": "Lisa Wilson", "employee_id": "EMP004", "salary": 150000, "department": "Engineering"}
+                ],
+                'expected_output': [
+                    {"name": "Sarah Johnson", "employee_id": "EMP002"},
+                    {"name": "Lisa Wilson", "employee_id": "EMP004"}
+                ]
+            },
+            {
+                'input': [
+                    {"name": "Alice Brown", "employee_id": "EMP005", "salary": 75000, "department": "HR"},
+                    {"name": "Bob Green", "employee_id": "EMP006", "salary": 110000, "department": "Engineering"},
+                    {"name": "Carol White", "employee_id": "EMP007", "salary": 95000, "department": "Marketing"}
+                ],
+                'expected_output': [
+                    {"name": "Bob Green", "employee_id": "EMP006"}
+                ]
+            },
+            {
+                'input': [
+                    {"name": "David Black", "employee_id": "EMP008", "salary": 85000, "department": "Sales"},
+                    {"name": "Eva Red", "employee_id": "EMP009", "salary": 92000, "department": "Engineering"}
+                ],
+                'expected_output': []
+            },
+            {
+                'input': [
+                    {"name": "Frank Blue", "employee_id": "EMP010", "salary": 100000, "department": "Engineering"},
+                    {"name": "Grace Yellow", "employee_id": "EMP011", "salary": 100001, "department": "Sales"}
+                ],
+                'expected_output': [
+                    {"name": "Grace Yellow", "employee_id": "EMP011"}
+                ]
+            }
+        ],
+        'difficulty': 'easy',
+        'category': 'data_extraction'
+    },
+    {
+        'id': 'q2_sales_report',
+        'title': 'Sales Report Analysis',
+        'description': '''Extract all sales representatives mentioned in the text along with their sales amounts in the format {name: ..., sales_amount: ...}.
 
 This question tests your ability to extract structured data from unstructured text.''',
-                    'test_cases': [
-                        {
-                            'input': "The quarterly sales report shows that our top performers this quarter were Sarah Johnson from the Sales department who achieved $45,000 in sales, followed by Mike Chen from Marketing with $38,500, and Lisa Rodriguez from Sales with $42,200.",
-                            'expected_output': [
-                                {"name": "Sarah Johnson", "sales_amount": 45000},
-                                {"name": "Mike Chen", "sales_amount": 38500},
-                                {"name": "Lisa Rodriguez", "sales_amount": 42200}
-                            ]
-                        },
-                        {
-                            'input': "This month's sales were disappointing. Only Tom Wilson managed to reach $25,000 in sales, while others struggled to meet their targets.",
-                            'expected_output': [
-                                {"name": "Tom Wilson", "sales_amount": 25000}
-                            ]
-                        },
-                        {
-                            'input': "No sales representatives met their targets this quarter. The highest performer was only able to achieve $15,500 in sales.",
-                            'expected_output': []
-                        },
-                        {
-                            'input': "Our star performers include Alex Kim ($125,000), Maria Garcia ($98,500), and David Lee ($87,200). They exceeded all expectations.",
-                            'expected_output': [
-                                {"name": "Alex Kim", "sales_amount": 125000},
-                                {"name": "Maria Garcia", "sales_amount": 98500},
-                                {"name": "David Lee", "sales_amount": 87200}
-                            ]
-                        }
-                    ],
-                    'difficulty': 'medium',
-                    'category': 'text_extraction'
-                }
-            ]
-            
-            for q_data in sample_questions:
-                question = Question(**q_data)
-                db.session.add(question)
-            
-            db.session.commit()
-            logging.info("Sample questions created successfully!")
+        'test_cases': [
+            {
+                'input': "The quarterly sales report shows that our top performers this quarter were Sarah Johnson from the Sales department who achieved $45,000 in sales, followed by Mike Chen from Marketing with $38,500, and Lisa Rodriguez from Sales with $42,200.",
+                'expected_output': [
+                    {"name": "Sarah Johnson", "sales_amount": 45000},
+                    {"name": "Mike Chen", "sales_amount": 38500},
+                    {"name": "Lisa Rodriguez", "sales_amount": 42200}
+                ]
+            },
+            {
+                'input': "This month's sales were disappointing. Only Tom Wilson managed to reach $25,000 in sales, while others struggled to meet their targets.",
+                'expected_output': [
+                    {"name": "Tom Wilson", "sales_amount": 25000}
+                ]
+            },
+            {
+                'input': "No sales representatives met their targets this quarter. The highest performer was only able to achieve $15,500 in sales.",
+                'expected_output': []
+            },
+            {
+                'input': "Our star performers include Alex Kim ($125,000), Maria Garcia ($98,500), and David Lee ($87,200). They exceeded all expectations.",
+                'expected_output': [
+                    {"name": "Alex Kim", "sales_amount": 125000},
+                    {"name": "Maria Garcia", "sales_amount": 98500},
+                    {"name": "David Lee", "sales_amount": 87200}
+                ]
+            }
+        ],
+        'difficulty': 'medium',
+        'category': 'text_extraction'
+    }
+]
+
+def init_db(seed=True):
+    """
+    Create any missing tables and insert any missing sample questions.
+    
+    Idempotent, so it is safe to run on every deploy. Runs in the current app context.
+    
+    Args:
+        seed (bool): Also insert the sample questions
+    
+    Returns:
+        int: Number of sample questions inserted
+    """
+    db.create_all()
+    if not seed:
+        return 0
+    
+    sample_ids = [question['id'] for question in SAMPLE_QUESTIONS]
+    existing = {question_id for (question_id,) in db.session.query(Question.id).filter(Question.id.in_(sample_ids))}
+    missing = [question for question in SAMPLE_QUESTIONS if question['id'] not in existing]
+    if missing:
+        # One multi-row insert instead of an ORM object per question
+        db.session.execute(insert(Question), missing)
+    db.session.commit()
+    return len(missing)
+
+@api.cli.command('init-db')
+@click.option('--no-seed', is_flag=True, help='Only create the tables')
+def init_db_command(no_seed):
+    """Create missing tables and seed the sample questions (safe to re-run)."""
+    inserted = init_db(seed=not no_seed)
+    print(f"Database ready ({inserted} sample questions inserted)")
+
+# Bcrypt is deliberately slow; hashes run on a small dedicated pool, and once that pool
+# and its queue are full further logins are turned away instead of tying up request threads
+AUTH_MAX_WORKERS = int(os.getenv('AUTH_MAX_WORKERS', '4'))
+AUTH_MAX_QUEUE = int(os.getenv('AUTH_MAX_QUEUE', '32'))
+AUTH_QUEUE_TIMEOUT = float(os.getenv('AUTH_QUEUE_TIMEOUT', '2'))
+auth_executor = ThreadPoolExecutor(max_workers=AUTH_MAX_WORKERS, thread_name_prefix='bcrypt')
+auth_slots = threading.BoundedSemaphore(AUTH_MAX_WORKERS + AUTH_MAX_QUEUE)
+
+class AuthBusy(Exception):
+    """Raised when too many password hashes are already running or queued."""
+
+def run_bcrypt(fn, *args):
+    """Run a bcrypt hash/check on the auth pool; raises AuthBusy if no slot frees up in time."""
+    if not auth_slots.acquire(timeout=AUTH_QUEUE_TIMEOUT):
+        raise AuthBusy()
+    try:
+        return auth_executor.submit(fn, *args).result()
+    finally:
+        auth_slots.release()
+
+@api.app_errorhandler(AuthBusy)
+def handle_auth_busy(e):
+    response = jsonify({'error': 'Too many sign-in requests, please retry shortly'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+# Read-only user fields by id, so authenticated requests don't re-read the users row every time
+identity_cache = LRUCache(
+    max_size=int(os.getenv('USER_CACHE_SIZE', '10000')),
+    ttl=float(os.getenv('USER_CACHE_TTL', '300'))
+)
+
+def serialize_user(user):
+    return {
+        'id': user.id,
+        'username': user.username,
+        'email': user.email,
+        'date_joined': user.date_joined.isoformat()
+    }
+
+def get_user_identity(user_id):
+    """
+    Return a user's public fields (as in serialize_user), or None if there is no such user.
+    
+    Served from identity_cache; changes made through the ORM invalidate the entry, and the
+    TTL bounds how long other workers can keep a stale copy.
+    """
+    identity = identity_cache.get(user_id)
+    if identity is None:
+        user = db.session.get(User, user_id)
+        if user is None:
+            return None
+        identity = serialize_user(user)
+        identity_cache.set(user_id, identity)
+    return identity
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def invalidate_user_identity(mapper, connection, target):
+    identity_cache.delete(target.id)
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    # A detached User carrying only the cached public fields (no password hash)
+    identity = get_user_identity(int(user_id))
+    if identity is None:
+        return None
+    return User(
+        id=identity['id'], username=identity['username'], email=identity['email'],
+        date_joined=datetime.fromisoformat(identity['date_joined'])
+    )
 
 # Authentication routes
-@app.route('/register', methods=['POST'])
+@api.route('/register', methods=['POST'])
 def register():
     data = request.get_json()
     
@@ -715,25 +2078,20 @@ def register():
     return jsonify({
         'message': 'User registered successfully',
         'access_token': access_token,
-        'user': {
-            'id': user.id,
-            'username': user.username,
-            'email': user.email,
-            'date_joined': user.date_joined.isoformat()
-        }
+        'user': serialize_user(user)
     }), 201
 
-@app.route('/login', methods=['POST'])
+@api.route('/login', methods=['POST'])
 def login():
     data = request.get_json()
     
     if not data or not data.get('username') or not data.get('password'):
         return jsonify({'error': 'Missing username or password'}), 400
     
-    # Find user by username or email
-    user = User.query.filter_by(username=data['username']).first()
-    if not user:
-        user = User.query.filter_by(email=data['username']).first()
+    # Find user by username or email in one query, preferring a username match
+    login_name = data['username']
+    user = User.query.filter(or_(User.username == login_name, User.email == login_name))\
+        .order_by(case((User.username == login_name, 0), else_=1)).first()
     
     if not user or not user.check_password(data['password']):
         return jsonify({'error': 'Invalid username or password'}), 401
@@ -744,79 +2102,203 @@ def login():
     return jsonify({
         'message': 'Login successful',
         'access_token': access_token,
-        'user': {
-            'id': user.id,
-            'username': user.username,
-            'email': user.email,
-            'date_joined': user.date_joined.isoformat()
-        }
+        'user': serialize_user(user)
     })
 
-@app.route('/logout', methods=['POST'])
+@api.route('/logout', methods=['POST'])
 @jwt_required()
 def logout():
     # In a real application, you might want to blacklist the token
     # For now, we'll just return a success message
     return jsonify({'message': 'Logout successful'})
 
-@app.route('/profile', methods=['GET'])
+@api.route('/profile', methods=['GET'])
 @jwt_required()
 def get_profile():
     user_id = int(get_jwt_identity())
-    user = User.query.get(user_id)
+    user = get_user_identity(user_id)
     
     if not user:
         return jsonify({'error': 'User not found'}), 404
     
-    # Get user statistics
-    total_attempts = PromptAttempt.query.filter_by(user_id=user_id).count()
-    correct_solutions = PromptAttempt.query.filter_by(user_id=user_id, success=True).count()
+    # Running totals maintained on every submission (see record_attempt_stats)
+    stats = db.session.get(UserStats, user_id)
+    total_attempts = stats.total_attempts if stats else 0
+    correct_solutions = stats.correct_solutions if stats else 0
     
     return jsonify({
-        'user': {
-            'id': user.id,
-            'username': user.username,
-            'email': user.email,
-            'date_joined': user.date_joined.isoformat()
-        },
+        'user': user,
         'stats': {
             'total_attempts': total_attempts,
             'correct_solutions': correct_solutions,
-            'success_rate': (correct_solutions / total_attempts * 100) if total_attempts > 0 else 0
+            'success_rate': (correct_solutions / total_attempts * 100) if total_attempts > 0 else 0,
+            'tokens_used': stats.tokens_used if stats else 0,
+            'last_attempt_at': stats.last_attempt_at.isoformat() if stats and stats.last_attempt_at else None
         }
     })
 
-@app.route('/submissions', methods=['GET'])
+@api.route('/submissions', methods=['GET'])
 @jwt_required()
 def get_submissions():
+    """
+    List the current user's submissions, newest first, with keyset pagination.
+    
+    Takes the same paging params as /get-results; user_prompt is only included
+    when requested with fields=user_prompt.
+    """
     user_id = int(get_jwt_identity())
+    try:
+        limit, position, fields, include_total = parse_attempt_page_args(('user_prompt',), default_limit=20)
+    except ValueError as e:
+        return jsonify({'error': f'Invalid paging parameters: {str(e)}'}), 400
     
     # Get user's submissions with question details
-    submissions = db.session.query(
-        PromptAttempt, Question.title
-    ).join(
-        Question, PromptAttempt.question_id == Question.id
-    ).filter(
-        PromptAttempt.user_id == user_id
-    ).order_by(
-        PromptAttempt.created_at.desc()
-    ).all()
+    columns = [
+        PromptAttempt.id, PromptAttempt.question_id, PromptAttempt.success,
+        PromptAttempt.score, PromptAttempt.created_at, Question.title
+    ] + [getattr(PromptAttempt, field) for field in fields]
+    query = db.session.query(*columns).join(Question, PromptAttempt.question_id == Question.id)
+    submissions, next_cursor = page_user_attempts(query, user_id, limit, position)
     
-    return jsonify({
-        'submissions': [
-            {
-                'id': attempt.id,
-                'question_title': title,
-                'question_id': attempt.question_id,
-                'status': '✅ Passed' if attempt.success else '❌ Failed',
-                'score': attempt.score,
-                'date_submitted': attempt.created_at.isoformat(),
-                'user_prompt': attempt.user_prompt
-            }
-            for attempt, title in submissions
-        ]
-    })
+    results = []
+    for row in submissions:
+        submission = {
+            'id': row.id,
+            'question_title': row.title,
+            'question_id': row.question_id,
+            'status': '✅ Passed' if row.success else '❌ Failed',
+            'score': row.score,
+            'date_submitted': row.created_at.isoformat()
+        }
+        if 'user_prompt' in fields:
+            submission['user_prompt'] = row.user_prompt
+        results.append(submission)
+    
+    response = {
+        'submissions': results,
+        'next_cursor': next_cursor,
+        'has_more': next_cursor is not None
+    }
+    if include_total:
+        response['total'] = user_attempt_total(user_id)
+    return jsonify(response)
+
+def engine_options(database_url):
+    """SQLAlchemy engine options for the configured database, including the pool sizes."""
+    if database_url.startswith('sqlite'):
+        return {}
+    return {
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_timeout': DB_POOL_TIMEOUT,
+        'pool_recycle': DB_POOL_RECYCLE,
+        'pool_pre_ping': True
+    }
+
+_background_app = None
+
+def background_app_context():
+    """App context for work running outside a request: LLM pool threads, job workers, the flusher."""
+    if _background_app is None:
+        raise RuntimeError('create_app() has not been called in this process')
+    return _background_app.app_context()
+
+def create_app(config=None):
+    """
+    Build the Flask app.
+    
+    The worker pools, caches and rate limiter are per process, so a process serves one
+    app; the most recently created one is used for background work.
+    
+    Args:
+        config (dict): Optional config overrides (e.g. SQLALCHEMY_DATABASE_URI for a script)
+    
+    Returns:
+        Flask: The configured application
+    """
+    global _background_app, attempt_writer
+    started = time.perf_counter()
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'your-secret-key-change-this')
+    app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'your-jwt-secret-key-change-this')
+    app.config['SQLALCHEMY_DATABASE_URI'] = DATABASE_URL
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config.update(config or {})
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config['SQLALCHEMY_DATABASE_URI']))
+    
+    # Initialize extensions
+    db.init_app(app)
+    CORS(app)
+    bcrypt.init_app(app)
+    jwt.init_app(app)
+    login_manager.init_app(app)
+    app.register_blueprint(api)
+    
+    if ATTEMPT_WRITE_BEHIND and attempt_writer is None:
+        backend = make_url(app.config['SQLALCHEMY_DATABASE_URI']).get_backend_name()
+        if backend in AttemptIdAllocator.dialects:
+            attempt_writer = WriteBehindBuffer(
+                flush_attempts,
+                max_batch=int(os.getenv('ATTEMPT_FLUSH_BATCH', '100')),
+                max_delay=float(os.getenv('ATTEMPT_FLUSH_INTERVAL', '0.5')),
+                max_pending=int(os.getenv('ATTEMPT_MAX_PENDING', '10000')),
+                name='attempt-writer'
+            )
+        else:
+            # Without a shared sequence, two workers would hand out the same attempt ids
+            logging.warning(f"ATTEMPT_WRITE_BEHIND needs PostgreSQL, not {backend}; writing attempts synchronously")
+    
+    _background_app = app
+    startup_timings['create_app_seconds'] = time.perf_counter() - started
+    logging.info(
+        f"App ready: module import {startup_timings['import_seconds'] * 1000:.0f} ms, "
+        f"create_app {startup_timings['create_app_seconds'] * 1000:.0f} ms"
+    )
+    return app
+
+_shutdown_lock = threading.Lock()
+_shut_down = False
+
+def shutdown(timeout=SHUTDOWN_TIMEOUT):
+    """
+    Gracefully stop this process's background work.
+    
+    Jobs that haven't started stay 'queued' in the database for the next process to pick
+    up (see recover_submission_jobs). Running jobs and in-flight streamed evaluations get
+    one shared timeout to finish; buffered attempt writes then get ATTEMPT_DRAIN_TIMEOUT.
+    Finally the worker pools and database connections are closed. Safe to call twice.
+    """
+    global _shut_down
+    with _shutdown_lock:
+        if _shut_down:
+            return
+        _shut_down = True
+    deadline = time.monotonic() + timeout
+    remaining = lambda: max(0.0, deadline - time.monotonic())
+    
+    left_queued = job_pool.shutdown(timeout=remaining(), drain=False)
+    if left_queued:
+        logging.info(f"Left {left_queued} queued jobs for the next process")
+    if not evaluations_in_flight.wait_idle(timeout=remaining()):
+        logging.error(f"Shut down with {evaluations_in_flight.count()} evaluations still running")
+    if attempt_writer is not None:
+        attempt_writer.shutdown(timeout=ATTEMPT_DRAIN_TIMEOUT)
+    llm_executor.shutdown(wait=False, cancel_futures=True)
+    auth_executor.shutdown(wait=False, cancel_futures=True)
+    if _background_app is not None:
+        with _background_app.app_context():
+            db.engine.dispose()
+
+atexit.register(shutdown)
+
+# How long this process took to import the module and to build its app. A pre-forked
+# worker inherits the import from the master, so only create_app runs per worker.
+startup_timings = {'import_seconds': time.perf_counter() - IMPORT_STARTED, 'create_app_seconds': None}
+metrics.gauge('llm_leetcode_startup_import_seconds', 'Time taken to import the app module',
+              lambda: startup_timings['import_seconds'])
+metrics.gauge('llm_leetcode_startup_create_app_seconds', 'Time taken by create_app() in this process',
+              lambda: startup_timings['create_app_seconds'] or 0)
 
 if __name__ == '__main__':
-    init_db()
-    app.run(debug=True, port=5001) 
\ No newline at end of file
+    # Development server; run `flask --app app init-db` once to create and seed the database
+    create_app().run(debug=True, port=5001) 
\ No newline at end of file
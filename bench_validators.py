@@ -0,0 +1,264 @@
+"""
+Microbenchmarks for response validation and JSON extraction.
+
+Generates synthetic model responses (large arrays, deep nesting, prose-wrapped JSON,
+code fences, brackets inside strings and adversarial non-JSON), then for every scenario
+times each validator, measures its peak allocation with tracemalloc, and checks its
+result against a golden corpus. That way an optimisation can be shown to be both
+faster and behaviour-preserving:
+
+    python bench_validators.py                      # time, measure and check against the corpus
+    python bench_validators.py --scenario prose     # only scenarios whose name contains "prose"
+    python bench_validators.py --json results.json  # also save the numbers
+    python bench_validators.py --update-golden      # accept the current results as the corpus
+
+The golden corpus stores a digest of each full result plus its pass/score, so it stays
+small even for 10k-entry responses. Exits with status 1 if any result differs.
+"""
+import argparse
+import gc
+import hashlib
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+GOLDEN_PATH = os.path.join(REPO_DIR, 'bench_validators_golden.json')
+
+sys.path.insert(0, REPO_DIR)
+
+from app import QuestionValidator, validate_multiple_test_cases, validate_single_test_case  # noqa: E402
+from json_extract import extract_json  # noqa: E402
+
+NAMES = ['Ada', 'Grace', 'Alan', 'Edsger', 'Barbara', 'Donald', 'Ken', 'Margaret', 'Linus', 'Guido']
+DEPARTMENTS = ['Engineering', 'Sales', 'Marketing', 'HR', 'Finance']
+
+
+def _employees(count, rng):
+    return [
+        {
+            'name': f'{rng.choice(NAMES)} {i}',
+            'employee_id': f'EMP{i:05d}',
+            'salary': rng.randrange(40000, 200000, 1000),
+            'department': rng.choice(DEPARTMENTS)
+        }
+        for i in range(count)
+    ]
+
+
+def _nested(depth, leaf):
+    value = leaf
+    for level in range(depth):
+        value = {'level': level, 'child': value}
+    return value
+
+
+def build_scenarios(seed=7):
+    """
+    Return the benchmark scenarios as (name, model_response, test_cases) tuples.
+
+    Every scenario is generated from a fixed seed so the golden corpus stays valid.
+    """
+    rng = random.Random(seed)
+    scenarios = []
+
+    # Typical responses to the bundled example questions
+    with open(os.path.join(REPO_DIR, 'test_cases.json')) as f:
+        examples = json.load(f)
+    for i, example in enumerate(examples):
+        test_case = {'input': example['dataset'], 'expected_output': example['expected_output']}
+        response = f"Here are the matching records:\n{json.dumps(example['expected_output'])}"
+        scenarios.append((f'example_{i + 1}', response, [test_case]))
+
+    # 10k-entry arrays: exact projections, extra keys, and a mostly-wrong answer
+    employees = _employees(10000, rng)
+    expected = [{'name': e['name'], 'employee_id': e['employee_id']} for e in employees if e['salary'] > 150000]
+    test_case = {'input': employees, 'expected_output': expected}
+    scenarios.append(('large_array_10k_exact', json.dumps(expected), [test_case]))
+    scenarios.append(('large_array_10k_extra_keys', json.dumps(employees), [test_case]))
+    shuffled = [{'name': e['name'], 'employee_id': e['employee_id']} for e in employees]
+    rng.shuffle(shuffled)
+    scenarios.append(('large_array_10k_shuffled_superset', json.dumps(shuffled), [test_case]))
+    wrong = [{'name': e['name'], 'employee_id': e['employee_id'] + 'X'} for e in employees]
+    scenarios.append(('large_array_10k_all_wrong', json.dumps(wrong), [test_case]))
+
+    # Deep nesting: matchable nested values, and nesting deep enough to hit the recursion limit
+    nested_expected = [{'id': i, 'tree': _nested(50, i)} for i in range(20)]
+    scenarios.append(('nested_depth_50', json.dumps(nested_expected), [{'input': [], 'expected_output': nested_expected}]))
+    too_deep = '[' * 100000 + ']' * 100000
+    scenarios.append(('nested_depth_100k', too_deep, [{'input': [], 'expected_output': [{'id': 1}]}]))
+
+    # Prose around the JSON, including brackets and quotes in the prose itself
+    small_expected = expected[:50]
+    small_case = {'input': employees[:500], 'expected_output': small_expected}
+    prose = ("Sure! I looked at each record [carefully] and here's what I found -- it's {mostly} "
+             "straightforward. \"Note\": salaries are in USD.\n\n")
+    scenarios.append(('prose_wrapped', prose * 20 + json.dumps(small_expected) + '\n\nHope this helps!', [small_case]))
+
+    # Code fences: a non-JSON fence first, then the answer in a ```json fence
+    fenced = (
+        "First I filtered the data:\n```python\nrows = [r for r in data if r['salary'] > 150000]\n```\n"
+        f"Result:\n```json\n{json.dumps(small_expected, indent=2)}\n```\nLet me know if you need more."
+    )
+    scenarios.append(('code_fence', fenced, [small_case]))
+
+    # Brackets, braces, escaped quotes and backslashes inside string values
+    tricky = [
+        {'name': f'Weird ]}}[{{ "name" {i} \\ end', 'employee_id': f'EMP[{i}]', 'note': '} ] { [ \\" "'}
+        for i in range(2000)
+    ]
+    tricky_expected = [{'name': t['name'], 'employee_id': t['employee_id']} for t in tricky[::10]]
+    scenarios.append(('brackets_in_strings', 'Output: ' + json.dumps(tricky) + ' [done]',
+                      [{'input': tricky, 'expected_output': tricky_expected}]))
+
+    # Adversarial non-JSON: long prose with no JSON, and many unbalanced openers before the answer
+    scenarios.append(('no_json_1mb', 'The answer is unclear. ' * 45000, [small_case]))
+    scenarios.append(('unbalanced_openers', '[{' * 20000 + ' oops\n' + json.dumps(small_expected), [small_case]))
+    scenarios.append(('stray_opener_in_prose', 'Consider {the data below:\n' + prose * 20 + json.dumps(small_expected),
+                      [small_case]))
+
+    # A single object instead of an array, and several test cases against one response
+    scenarios.append(('single_object', json.dumps(small_expected[0]), [{'input': [], 'expected_output': small_expected[0]}]))
+    multi_cases = [{'input': [], 'expected_output': expected[i:i + 25]} for i in range(0, 200, 25)]
+    scenarios.append(('multiple_cases_8', json.dumps(expected), multi_cases))
+
+    return scenarios
+
+
+def validators_for(test_cases):
+    """The validation entry points to benchmark, as name -> fn(model_response)."""
+    compiled = QuestionValidator(test_cases)
+    return {
+        'validate_single_test_case': lambda response: [
+            validate_single_test_case(response, test_case) for test_case in test_cases
+        ],
+        'compiled_validator': lambda response: [
+            compiled.validate(i, response) for i in range(len(test_cases))
+        ],
+        'validate_multiple_test_cases': lambda response: validate_multiple_test_cases(response, test_cases),
+        'extract_json': _extract_or_error
+    }
+
+
+def _extract_or_error(response):
+    try:
+        return extract_json(response)
+    except json.JSONDecodeError as e:
+        return {'error': 'JSONDecodeError', 'pos': e.pos}
+
+
+def _digest(result):
+    payload = json.dumps(result, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _summary(result):
+    """Pass/score of a validator result, for readable golden entries."""
+    if isinstance(result, list) and result and isinstance(result[0], dict) and 'pass' in result[0]:
+        return {'pass': [r['pass'] for r in result], 'score': [r['score'] for r in result]}
+    if isinstance(result, dict) and 'overall_score' in result:
+        return {'pass': result['pass'], 'score': result['overall_score']}
+    return {}
+
+
+def time_call(fn, arg, min_time, max_runs):
+    """Run fn(arg) repeatedly for at least min_time seconds; returns per-call seconds."""
+    timings = []
+    started = time.perf_counter()
+    while len(timings) < max_runs and (len(timings) < 3 or time.perf_counter() - started < min_time):
+        t0 = time.perf_counter()
+        fn(arg)
+        timings.append(time.perf_counter() - t0)
+    return timings
+
+
+def peak_allocation(fn, arg):
+    """Peak bytes allocated by a single fn(arg) call."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        baseline, _ = tracemalloc.get_traced_memory()
+        fn(arg)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak - baseline
+
+
+def run(args):
+    golden = {}
+    if os.path.exists(args.golden) and not args.update_golden:
+        with open(args.golden) as f:
+            golden = json.load(f)
+
+    results, mismatches, new_golden = [], [], {}
+    for name, response, test_cases in build_scenarios():
+        if args.scenario and args.scenario not in name:
+            continue
+        for validator_name, fn in validators_for(test_cases).items():
+            if args.validator and args.validator not in validator_name:
+                continue
+            key = f'{name}/{validator_name}'
+
+            output = fn(response)
+            entry = dict(_summary(output), digest=_digest(output))
+            new_golden[key] = entry
+            expected = golden.get(key)
+            status = 'new' if expected is None else ('ok' if expected['digest'] == entry['digest'] else 'MISMATCH')
+            if status == 'MISMATCH':
+                mismatches.append(key)
+
+            timings = time_call(fn, response, args.min_time, args.max_runs)
+            peak = peak_allocation(fn, response) if not args.no_memory else None
+            row = {
+                'scenario': name,
+                'validator': validator_name,
+                'response_bytes': len(response),
+                'runs': len(timings),
+                'min_ms': round(min(timings) * 1000, 3),
+                'median_ms': round(statistics.median(timings) * 1000, 3),
+                'peak_kib': round(peak / 1024, 1) if peak is not None else None,
+                'golden': status
+            }
+            results.append(row)
+            print(f"{name:36s} {validator_name:30s} {row['median_ms']:10.3f} ms  "
+                  f"{row['peak_kib'] if peak is not None else '-':>10} KiB  {status}")
+
+    if args.update_golden:
+        if args.scenario or args.validator:
+            # Keep the entries for everything that wasn't re-run
+            if os.path.exists(args.golden):
+                with open(args.golden) as f:
+                    new_golden = dict(json.load(f), **new_golden)
+        with open(args.golden, 'w') as f:
+            json.dump(new_golden, f, indent=2, sort_keys=True)
+        print(f'Golden corpus written to {args.golden} ({len(new_golden)} entries)')
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'python': sys.version.split()[0], 'results': results}, f, indent=2)
+
+    if mismatches:
+        print(f'\n{len(mismatches)} result(s) differ from the golden corpus:')
+        for key in mismatches:
+            print(f'  {key}')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark validators and JSON extraction')
+    parser.add_argument('--scenario', help='Only run scenarios whose name contains this')
+    parser.add_argument('--validator', help='Only run validators whose name contains this')
+    parser.add_argument('--min-time', type=float, default=0.5, help='Seconds to spend timing each case')
+    parser.add_argument('--max-runs', type=int, default=1000)
+    parser.add_argument('--no-memory', action='store_true', help='Skip the tracemalloc pass')
+    parser.add_argument('--json', help='Also write the results to this file')
+    parser.add_argument('--golden', default=GOLDEN_PATH)
+    parser.add_argument('--update-golden', action='store_true', help='Replace the golden corpus with these results')
+    sys.exit(run(parser.parse_args()))
@@ -6,12 +6,15 @@ import Navigation from './components/Navigation';
 import Profile from './components/Profile';
 import './App.css';
 
-interface Question {
+interface QuestionSummary {
   id: string;
   title: string;
-  description: string;
   difficulty: 'easy' | 'medium' | 'hard';
   category: string;
+}
+
+interface Question extends QuestionSummary {
+  description: string;
   test_cases: Array<{
     input: any;
     expected_output: any;
@@ -142,7 +145,7 @@ const TestCaseResult: React.FC<{
 
 // Practice Component
 const Practice: React.FC<{ user: User }> = ({ user }) => {
-  const [questions, setQuestions] = useState<Question[]>([]);
+  const [questions, setQuestions] = useState<QuestionSummary[]>([]);
   const [currentQuestion, setCurrentQuestion] = useState<Question | null>(null);
   const [prompt, setPrompt] = useState('');
   const [isSubmitting, setIsSubmitting] = useState(false);
@@ -155,16 +158,36 @@ const Practice: React.FC<{ user: User }> = ({ user }) => {
 
   const fetchQuestions = async () => {
     try {
-      const response = await axios.get('http://localhost:5001/questions');
-      setQuestions(response.data.questions || response.data);
-      if ((response.data.questions || response.data).length > 0) {
-        setCurrentQuestion((response.data.questions || response.data)[0]);
+      // The list only carries summaries; page through it with the keyset cursor
+      const summaries: QuestionSummary[] = [];
+      let cursor: string | null = null;
+      do {
+        const response: { data: { questions: QuestionSummary[]; next_cursor: string | null } } =
+          await axios.get('http://localhost:5001/questions', {
+            params: { limit: 200, ...(cursor ? { cursor } : {}) }
+          });
+        summaries.push(...response.data.questions);
+        cursor = response.data.next_cursor;
+      } while (cursor);
+
+      setQuestions(summaries);
+      if (summaries.length > 0) {
+        await selectQuestion(summaries[0].id);
       }
     } catch (error) {
       console.error('Error fetching questions:', error);
     }
   };
 
+  const selectQuestion = async (questionId: string) => {
+    try {
+      const response = await axios.get(`http://localhost:5001/get-question/${questionId}`);
+      setCurrentQuestion(response.data);
+    } catch (error) {
+      console.error('Error fetching question:', error);
+    }
+  };
+
   const handleSubmit = async () => {
     if (!currentQuestion || !prompt.trim()) {
       alert('Please fill in all fields');
@@ -176,28 +199,79 @@ const Practice: React.FC<{ user: User }> = ({ user }) => {
 
     try {
       const token = localStorage.getItem('token');
-      const response = await axios.post('http://localhost:5001/submit-prompt', {
-        question_id: currentQuestion.id,
-        user_prompt: prompt
-      }, {
+      // Stream results so each test case renders as soon as it has been evaluated
+      const response = await fetch('http://localhost:5001/submit-prompt/stream', {
+        method: 'POST',
         headers: {
+          'Content-Type': 'application/json',
           'Authorization': `Bearer ${token}`
-        }
+        },
+        body: JSON.stringify({
+          question_id: currentQuestion.id,
+          user_prompt: prompt
+        })
       });
 
-      const newResult = {
-        score: response.data.score * 100,
-        feedback: response.data.success ? 'Great job! Your prompt worked correctly.' : 'Your prompt needs improvement. Check the details below.',
-        passed: response.data.success,
-        test_case_results: response.data.test_case_results,
-        passed_cases: response.data.passed_cases,
-        total_cases: response.data.total_cases,
-        modelResponse: response.data.model_response,
-        parsedResponse: response.data.parsed_response,
-        formatIssues: response.data.format_issues
-      };
-
-      setResult(newResult);
+      if (!response.ok || !response.body) {
+        throw new Error(`Request failed with status ${response.status}`);
+      }
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      const testCaseResults: TestCaseResult[] = [];
+      let buffer = '';
+      let done = false;
+
+      while (!done) {
+        const chunk = await reader.read();
+        if (chunk.done) break;
+        buffer += decoder.decode(chunk.value, { stream: true });
+
+        // SSE messages are separated by a blank line
+        const messages = buffer.split('\n\n');
+        buffer = messages.pop() || '';
+
+        for (const message of messages) {
+          const eventLine = message.split('\n').find(line => line.startsWith('event: '));
+          const dataLine = message.split('\n').find(line => line.startsWith('data: '));
+          if (!eventLine || !dataLine) continue;
+
+          const event = eventLine.slice('event: '.length);
+          const data = JSON.parse(dataLine.slice('data: '.length));
+
+          if (event === 'test_case') {
+            testCaseResults.push(data);
+            testCaseResults.sort((a, b) => a.test_case_id - b.test_case_id);
+            const passedSoFar = testCaseResults.filter(testResult => testResult.passed).length;
+            setResult({
+              score: 0,
+              feedback: `Evaluated ${testCaseResults.length}/${currentQuestion.test_cases.length} test cases...`,
+              passed: false,
+              test_case_results: [...testCaseResults],
+              passed_cases: passedSoFar,
+              total_cases: currentQuestion.test_cases.length,
+              modelResponse: '',
+              parsedResponse: null,
+              formatIssues: []
+            });
+          } else if (event === 'summary') {
+            setResult({
+              score: data.score * 100,
+              feedback: data.success ? 'Great job! Your prompt worked correctly.' : 'Your prompt needs improvement. Check the details below.',
+              passed: data.success,
+              test_case_results: [...testCaseResults],
+              passed_cases: data.passed_cases,
+              total_cases: data.total_cases,
+              modelResponse: '',
+              parsedResponse: null,
+              formatIssues: data.format_issues
+            });
+            done = true;
+          } else if (event === 'error') {
+            throw new Error(data.error);
+          }
+        }
+      }
     } catch (error) {
       console.error('Error submitting prompt:', error);
       setResult({
@@ -241,7 +315,7 @@ const Practice: React.FC<{ user: User }> = ({ user }) => {
               {questions.map((question) => (
                 <button
                   key={question.id}
-                  onClick={() => setCurrentQuestion(question)}
+                  onClick={() => selectQuestion(question.id)}
                   className={`w-full text-left p-3 rounded-lg transition-colors duration-200 ${
                     currentQuestion?.id === question.id
                       ? 'bg-primary-50 border border-primary-200'
@@ -0,0 +1,49 @@
+"""
+Gunicorn settings for serving the API in production:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Requests spend most of their time waiting on the LLM, not on the CPU, so each worker
+process runs many threads (gthread) instead of one request at a time. Every setting
+can be overridden from the environment.
+"""
+import os
+
+bind = os.getenv('BIND', '0.0.0.0:5001')
+worker_class = 'gthread'
+# A few processes for CPU work (validation, bcrypt), many threads each for LLM waits.
+# app.py sizes its LLM pool (LLM_MAX_WORKERS) from the same SERVER_THREADS.
+workers = int(os.getenv('WEB_CONCURRENCY', '2'))
+threads = int(os.getenv('SERVER_THREADS', '64'))
+
+# The same defaults as app.py
+submission_deadline = float(os.getenv('SUBMISSION_DEADLINE', '90'))
+shutdown_timeout = float(os.getenv('SHUTDOWN_TIMEOUT', str(submission_deadline + 10)))
+attempt_drain_timeout = float(os.getenv('ATTEMPT_DRAIN_TIMEOUT', '30'))
+
+# Long enough for a full submission (SUBMISSION_DEADLINE plus persistence)
+timeout = int(os.getenv('SERVER_TIMEOUT', str(int(submission_deadline) + 30)))
+keepalive = 5
+# On SIGTERM a worker stops accepting connections and finishes its in-flight requests
+# (up to a submission's deadline plus persistence), then worker_exit runs shutdown(),
+# which waits up to SHUTDOWN_TIMEOUT for running jobs and ATTEMPT_DRAIN_TIMEOUT for
+# buffered writes. The master kills workers still alive after graceful_timeout, so it
+# covers all three in sequence.
+graceful_timeout = int(submission_deadline + 10 + shutdown_timeout + attempt_drain_timeout) + 5
+# Each worker builds its own app, pools and clients after the fork
+preload_app = False
+accesslog = '-'
+
+
+def on_starting(server):
+    # Import the code, but not the app, in the master so workers fork with it already
+    # loaded and only run create_app(); the OpenAI SDK is otherwise imported on first use
+    import app  # noqa: F401
+    if os.getenv('LLM_BACKEND', 'openai').lower() == 'openai':
+        import openai  # noqa: F401
+
+
+def worker_exit(server, worker):
+    # Drain background work before the worker process exits
+    from app import shutdown
+    shutdown()
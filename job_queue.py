@@ -0,0 +1,156 @@
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class FairJobQueue:
+    """
+    In-process job queue that schedules round-robin across users.
+
+    Each user gets their own FIFO; get() takes the next job from the next user
+    in rotation, so one user queueing dozens of jobs only delays their own work.
+    """
+
+    def __init__(self):
+        self._queues = {}          # user_id -> deque of pending jobs
+        self._rotation = deque()   # user_ids with pending jobs, in service order
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def put(self, user_id, job):
+        with self._cond:
+            if self._closed:
+                raise RuntimeError('Job queue is closed')
+            if user_id not in self._queues:
+                self._queues[user_id] = deque()
+                self._rotation.append(user_id)
+            self._queues[user_id].append(job)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """
+        Take the next job in fair order.
+
+        Returns:
+            The job, or None if the timeout expired or the queue was closed and is empty.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._rotation or self._closed, timeout=timeout):
+                return None
+            if not self._rotation:
+                return None
+
+            user_id = self._rotation.popleft()
+            user_queue = self._queues[user_id]
+            job = user_queue.popleft()
+            if user_queue:
+                # User still has work: go to the back of the line
+                self._rotation.append(user_id)
+            else:
+                del self._queues[user_id]
+            return job
+
+    def close(self, discard=False):
+        """
+        Stop accepting jobs; workers drain what is left and then exit.
+
+        Args:
+            discard: Drop the jobs still waiting instead of draining them
+
+        Returns:
+            int: Number of jobs dropped
+        """
+        with self._cond:
+            self._closed = True
+            dropped = 0
+            if discard:
+                dropped = sum(len(q) for q in self._queues.values())
+                self._queues.clear()
+                self._rotation.clear()
+            self._cond.notify_all()
+            return dropped
+
+    def pending(self, user_id=None):
+        with self._cond:
+            if user_id is not None:
+                return len(self._queues.get(user_id, ()))
+            return sum(len(q) for q in self._queues.values())
+
+
+class JobWorkerPool:
+    """Fixed pool of daemon threads that run handler(job) for each job taken from a FairJobQueue."""
+
+    def __init__(self, handler, num_workers=4, name='job-worker'):
+        self.queue = FairJobQueue()
+        self._handler = handler
+        self._num_workers = num_workers
+        self._name = name
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self._num_workers):
+                thread = threading.Thread(target=self._run, name=f'{self._name}-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, user_id, job):
+        self.start()
+        self.queue.put(user_id, job)
+
+    def shutdown(self, timeout=None, drain=True):
+        """
+        Close the queue and wait, up to timeout seconds in total, for the workers to exit.
+
+        With drain=False, jobs that haven't started are dropped and only running ones are
+        waited for. Returns the number of jobs dropped.
+        """
+        dropped = self.queue.close(discard=not drain)
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()) if deadline is not None else None)
+        return dropped
+
+    def _run(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+            try:
+                self._handler(job)
+            except Exception as e:
+                logging.error(f"Unhandled error in {self._name}: {e}")
+
+
+class InflightTracker:
+    """Counts units of work in progress so a shutdown can wait for them to finish."""
+
+    def __init__(self):
+        self._count = 0
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def track(self):
+        with self._cond:
+            self._count += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._count -= 1
+                if self._count == 0:
+                    self._cond.notify_all()
+
+    def count(self):
+        with self._cond:
+            return self._count
+
+    def wait_idle(self, timeout=None):
+        """Block until nothing is in progress; returns False if the timeout expired first."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._count == 0, timeout=timeout)
@@ -0,0 +1,120 @@
+import json
+import re
+
+# Characters that matter when looking for JSON: brackets, string delimiters and escapes
+_STRUCTURAL = re.compile(r'[\[\]{}"\\]')
+_CODE_FENCE = re.compile(r'```[ \t]*([A-Za-z0-9_-]*)[ \t]*\n(.*?)```', re.DOTALL)
+_CLOSERS = {']': '[', '}': '{'}
+
+_decoder = json.JSONDecoder()
+
+
+def _balanced_spans(text):
+    """
+    Yield (start, end) of each top-level balanced [...] / {...} group, in order, in one pass.
+
+    Quotes are only treated as JSON strings inside a bracket group, so apostrophes and
+    quotes in the surrounding prose don't throw the scan off; brackets inside strings
+    and escaped characters are ignored. When a group turns out to be mismatched, is
+    never closed (e.g. a stray "{" in prose before the answer) or is resumed after
+    failing to parse, the complete groups nested directly inside it are yielded next.
+    """
+    # Each open bracket keeps the spans of the complete groups directly inside it, which
+    # are only candidates if that bracket never closes properly
+    stack = []
+    in_string = False
+    skip_until = -1
+
+    for match in _STRUCTURAL.finditer(text):
+        pos = match.start()
+        if pos < skip_until:
+            continue  # Character escaped by a preceding backslash
+        char = match.group()
+
+        if in_string:
+            if char == '\\':
+                skip_until = pos + 2
+            elif char == '"':
+                in_string = False
+            continue
+
+        if char == '"':
+            if stack:
+                in_string = True
+        elif char in '[{':
+            stack.append((char, pos, []))
+        elif char in _CLOSERS:
+            if not stack:
+                continue
+            if stack[-1][0] != _CLOSERS[char]:
+                # Not JSON after all; abandon this group and look inside it instead
+                for _, _, inner in stack:
+                    yield from inner
+                stack.clear()
+                continue
+            _, start, inner = stack.pop()
+            if stack:
+                stack[-1][2].append((start, pos + 1))
+            else:
+                yield start, pos + 1
+                # Only reached if the group didn't parse; its direct children may
+                yield from inner
+
+    # Brackets left open: outer brackets' groups all come before their inner brackets'
+    for _, _, inner in stack:
+        yield from inner
+
+
+def _first_json_value(text):
+    # Fast path: the first bracket usually starts the JSON, and the C decoder finds its end
+    starts = [pos for pos in (text.find('['), text.find('{')) if pos != -1]
+    if starts:
+        try:
+            value, _ = _decoder.raw_decode(text[min(starts):])
+            return True, value
+        except (json.JSONDecodeError, RecursionError):
+            pass
+
+    # Parse slices rather than raw_decode(text, start): building a JSONDecodeError scans
+    # back to the start of the document, which would make repeated failures quadratic
+    for start, end in _balanced_spans(text):
+        try:
+            return True, json.loads(text[start:end])
+        except (json.JSONDecodeError, RecursionError):
+            continue
+    return False, None
+
+
+def extract_json(text):
+    """
+    Extract the first JSON array or object embedded in a model response.
+
+    Fenced code blocks (```json ... ```) are searched first, then the whole text.
+    Candidate values are found in a single string-aware pass over the text and each
+    candidate is parsed at most once, so the cost stays linear in the response length.
+
+    Args:
+        text (str): The model's raw response
+
+    Returns:
+        The parsed JSON value
+
+    Raises:
+        json.JSONDecodeError: If the response contains no parseable JSON
+    """
+    response_text = text.strip()
+
+    for fence in _CODE_FENCE.finditer(response_text):
+        found, value = _first_json_value(fence.group(2))
+        if found:
+            return value
+
+    found, value = _first_json_value(response_text)
+    if found:
+        return value
+
+    # No array or object anywhere: the response may still be a bare JSON scalar
+    try:
+        return json.loads(response_text)
+    except RecursionError:
+        raise json.JSONDecodeError('JSON is nested too deeply', response_text, 0)
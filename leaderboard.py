@@ -0,0 +1,80 @@
+import threading
+from bisect import bisect_left, insort
+
+
+def rank_key(score, tokens_used, achieved_at):
+    """Sort key for a leaderboard entry: best score, then fewest tokens, then earliest."""
+    return (-score, tokens_used, achieved_at)
+
+
+class Leaderboard:
+    """
+    One question's leaderboard, held as a sorted list of each user's best entry.
+
+    Top-N is a slice and a user's rank is a binary search, so reads don't depend on
+    how many attempts the question has. Entries are kept in sync incrementally with
+    offer() as attempts are saved.
+    """
+
+    def __init__(self, entries=()):
+        """
+        Args:
+            entries: (user_id, username, score, tokens_used, achieved_at) tuples, one per user
+        """
+        self._lock = threading.Lock()
+        self._order = []        # (rank_key..., user_id), sorted
+        self._entries = {}      # user_id -> (username, score, tokens_used, achieved_at)
+        for user_id, username, score, tokens_used, achieved_at in entries:
+            self._entries[user_id] = (username, score, tokens_used, achieved_at)
+            self._order.append(rank_key(score, tokens_used, achieved_at) + (user_id,))
+        self._order.sort()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._order)
+
+    def offer(self, user_id, username, score, tokens_used, achieved_at):
+        """
+        Record an attempt; it replaces the user's entry only if it ranks better.
+
+        Returns:
+            bool: Whether the user's entry changed
+        """
+        new_key = rank_key(score, tokens_used, achieved_at) + (user_id,)
+        with self._lock:
+            current = self._entries.get(user_id)
+            if current is not None:
+                _, *best = current
+                old_key = rank_key(*best) + (user_id,)
+                if old_key <= new_key:
+                    return False
+                del self._order[bisect_left(self._order, old_key)]
+            self._entries[user_id] = (username, score, tokens_used, achieved_at)
+            insort(self._order, new_key)
+            return True
+
+    def _entry(self, position, key):
+        user_id = key[-1]
+        username, score, tokens_used, achieved_at = self._entries[user_id]
+        return {
+            'rank': position + 1,
+            'user_id': user_id,
+            'username': username,
+            'score': score,
+            'tokens_used': tokens_used,
+            'achieved_at': achieved_at.isoformat() if achieved_at else None
+        }
+
+    def top(self, limit):
+        with self._lock:
+            return [self._entry(position, key) for position, key in enumerate(self._order[:limit])]
+
+    def rank(self, user_id):
+        """Return the user's entry with its 1-based rank, or None if they have no attempt."""
+        with self._lock:
+            current = self._entries.get(user_id)
+            if current is None:
+                return None
+            _, *best = current
+            key = rank_key(*best) + (user_id,)
+            return self._entry(bisect_left(self._order, key), key)
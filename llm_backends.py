@@ -0,0 +1,304 @@
+"""
+LLM backends used to evaluate prompts.
+
+`OpenAIBackend` talks to the OpenAI API (or any OpenAI-compatible server) through one
+pooled HTTP client per process. `FakeLLMBackend` is a deterministic local stand-in with
+scripted/rule-based responses, a configurable latency distribution and failure rate, so
+the submit path can be exercised and load-tested without network access.
+
+The fake can also be served over HTTP as an OpenAI-compatible endpoint:
+
+    python llm_backends.py --port 8089
+
+and the app pointed at it with LLM_BACKEND=openai and LLM_BASE_URL=http://localhost:8089/v1.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import namedtuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LLMResult = namedtuple('LLMResult', ['content', 'prompt_tokens', 'completion_tokens', 'total_tokens'])
+
+
+class LLMBackendError(Exception):
+    """Error raised by a backend call; status_code mirrors the upstream HTTP status when known."""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class LLMBackend:
+    """Interface for chat-completion backends."""
+
+    name = 'base'
+
+    def complete(self, prompt, model, temperature=0, max_tokens=1000):
+        """
+        Run a single-message chat completion.
+
+        Returns:
+            LLMResult: The response text and token usage
+        """
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class OpenAIBackend(LLMBackend):
+    """OpenAI chat completions through a lazily created, pooled client shared by all threads."""
+
+    name = 'openai'
+
+    def __init__(self, api_key=None, base_url=None, timeout=60.0, max_connections=20, max_retries=0):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.max_retries = max_retries
+        self._client = None
+        self._client_pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        # A client created before a fork shares its connection pool with the parent
+        if self._client is None or self._client_pid != os.getpid():
+            with self._lock:
+                if self._client is None or self._client_pid != os.getpid():
+                    self._client = self._create_client()
+                    self._client_pid = os.getpid()
+        return self._client
+
+    def _create_client(self):
+        from openai import DEFAULT_CONNECTION_LIMITS, DefaultHttpxClient, OpenAI
+
+        # Build the pool through the SDK so it uses whichever HTTP library the SDK ships with
+        limits = type(DEFAULT_CONNECTION_LIMITS)(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_connections
+        )
+        return OpenAI(
+            api_key=self.api_key,
+            base_url=self.base_url,
+            timeout=self.timeout,
+            max_retries=self.max_retries,
+            http_client=DefaultHttpxClient(limits=limits, timeout=self.timeout)
+        )
+
+    def complete(self, prompt, model, temperature=0, max_tokens=1000):
+        response = self.client.chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "user", "content": prompt}
+            ],
+            temperature=temperature,
+            max_tokens=max_tokens
+        )
+        usage = response.usage
+        return LLMResult(
+            content=response.choices[0].message.content,
+            prompt_tokens=usage.prompt_tokens if usage else 0,
+            completion_tokens=usage.completion_tokens if usage else 0,
+            total_tokens=usage.total_tokens if usage else 0
+        )
+
+    def close(self):
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+
+def _estimate_tokens(text):
+    return len(text) // 4 + 1
+
+
+class FakeLLMBackend(LLMBackend):
+    """
+    Deterministic local stand-in for the OpenAI API.
+
+    Responses come from `script`, a list of {"match": <regex>, "response": <str or JSON>} rules
+    checked in order against the prompt. If nothing matches, the fake echoes each dataset in
+    the prompt back as JSON, which looks like a plausible (if unfiltered) extraction.
+
+    Latency is log-normal around `latency_ms` with shape `latency_sigma`, so the tail looks
+    like a real API. A `failure_rate` fraction of calls raise LLMBackendError with a 429/500/503.
+    """
+
+    name = 'fake'
+
+    def __init__(self, script=None, latency_ms=0.0, latency_sigma=0.5, failure_rate=0.0, seed=None):
+        self.rules = [(re.compile(rule['match']), rule['response']) for rule in (script or [])]
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    @classmethod
+    def from_script_file(cls, path, **kwargs):
+        with open(path) as f:
+            return cls(script=json.load(f), **kwargs)
+
+    def _sample(self):
+        # random.Random is not safe to share between threads without a lock
+        with self._lock:
+            self.calls += 1
+            latency = self._random.lognormvariate(0, self.latency_sigma) * self.latency_ms if self.latency_ms > 0 else 0.0
+            failure = self._random.random() < self.failure_rate
+            status_code = self._random.choice([429, 500, 503])
+        return latency / 1000.0, failure, status_code
+
+    def respond(self, prompt):
+        """Return the scripted or rule-based response text for a prompt."""
+        for pattern, response in self.rules:
+            if pattern.search(prompt):
+                return response if isinstance(response, str) else json.dumps(response)
+        return self._echo_datasets(prompt)
+
+    def _echo_datasets(self, prompt):
+        decoder = json.JSONDecoder()
+        datasets = []
+        for match in re.finditer(r'^Dataset(?: (\d+))?:\n', prompt, re.MULTILINE):
+            try:
+                value, _ = decoder.raw_decode(prompt, match.end())
+            except json.JSONDecodeError:
+                continue
+            datasets.append((match.group(1), value if isinstance(value, (list, dict)) else []))
+
+        if datasets and all(label is not None for label, _ in datasets):
+            # Batched prompt: answer with an object keyed by dataset number
+            return json.dumps({label: value for label, value in datasets})
+        if datasets:
+            return json.dumps(datasets[0][1])
+        return '[]'
+
+    def complete(self, prompt, model, temperature=0, max_tokens=1000):
+        latency, failure, status_code = self._sample()
+        if latency:
+            time.sleep(latency)
+        if failure:
+            raise LLMBackendError(f'Fake LLM injected failure ({status_code})', status_code=status_code)
+
+        content = self.respond(prompt)
+        prompt_tokens = _estimate_tokens(prompt)
+        completion_tokens = min(_estimate_tokens(content), max_tokens)
+        return LLMResult(content, prompt_tokens, completion_tokens, prompt_tokens + completion_tokens)
+
+
+def create_backend_from_env(max_concurrent_calls=10):
+    """
+    Build the backend selected by LLM_BACKEND (openai or fake) and its settings.
+
+    The OpenAI connection pool defaults to one connection per concurrent call plus one
+    for its hedge, so the pool never caps concurrency below max_concurrent_calls.
+    """
+    backend = os.getenv('LLM_BACKEND', 'openai').lower()
+
+    if backend == 'fake':
+        kwargs = {
+            'latency_ms': float(os.getenv('FAKE_LLM_LATENCY_MS', '0')),
+            'latency_sigma': float(os.getenv('FAKE_LLM_LATENCY_SIGMA', '0.5')),
+            'failure_rate': float(os.getenv('FAKE_LLM_FAILURE_RATE', '0')),
+            'seed': int(os.getenv('FAKE_LLM_SEED')) if os.getenv('FAKE_LLM_SEED') else None
+        }
+        script_path = os.getenv('FAKE_LLM_SCRIPT')
+        if script_path:
+            return FakeLLMBackend.from_script_file(script_path, **kwargs)
+        return FakeLLMBackend(**kwargs)
+
+    if backend == 'openai':
+        return OpenAIBackend(
+            api_key=os.getenv('OPENAI_API_KEY'),
+            base_url=os.getenv('LLM_BASE_URL') or None,
+            timeout=float(os.getenv('LLM_TIMEOUT', '60')),
+            max_connections=int(os.getenv('LLM_MAX_CONNECTIONS', str(2 * max_concurrent_calls))),
+            # Transient errors are retried by llm_retry (LLM_MAX_ATTEMPTS); SDK retries on top
+            # of that would multiply attempts and hide them from the retry metrics
+            max_retries=int(os.getenv('LLM_SDK_MAX_RETRIES', '0'))
+        )
+
+    raise ValueError(f'Unknown LLM_BACKEND: {backend}')
+
+
+def make_fake_server(backend, host='127.0.0.1', port=8089):
+    """Create an HTTP server exposing `backend` as an OpenAI-compatible /v1/chat/completions endpoint."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.path.rstrip('/') != '/v1/chat/completions':
+                self._send(404, {'error': {'message': 'Not found'}})
+                return
+
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            prompt = '\n'.join(message.get('content', '') for message in body.get('messages', []))
+            try:
+                result = backend.complete(
+                    prompt,
+                    model=body.get('model', 'fake'),
+                    temperature=body.get('temperature', 0),
+                    max_tokens=body.get('max_tokens', 1000)
+                )
+            except LLMBackendError as e:
+                self._send(e.status_code or 500, {'error': {'message': str(e), 'type': 'fake_error'}})
+                return
+
+            self._send(200, {
+                'id': f'chatcmpl-fake-{backend.calls}',
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': body.get('model', 'fake'),
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': result.content},
+                    'finish_reason': 'stop'
+                }],
+                'usage': {
+                    'prompt_tokens': result.prompt_tokens,
+                    'completion_tokens': result.completion_tokens,
+                    'total_tokens': result.total_tokens
+                }
+            })
+
+        def _send(self, status, payload):
+            data = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return ThreadingHTTPServer((host, port), Handler)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the fake LLM as a local OpenAI-compatible server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency-ms', type=float, default=float(os.getenv('FAKE_LLM_LATENCY_MS', '0')))
+    parser.add_argument('--latency-sigma', type=float, default=float(os.getenv('FAKE_LLM_LATENCY_SIGMA', '0.5')))
+    parser.add_argument('--failure-rate', type=float, default=float(os.getenv('FAKE_LLM_FAILURE_RATE', '0')))
+    parser.add_argument('--script', default=os.getenv('FAKE_LLM_SCRIPT'))
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    kwargs = {
+        'latency_ms': args.latency_ms,
+        'latency_sigma': args.latency_sigma,
+        'failure_rate': args.failure_rate,
+        'seed': args.seed
+    }
+    fake = FakeLLMBackend.from_script_file(args.script, **kwargs) if args.script else FakeLLMBackend(**kwargs)
+    server = make_fake_server(fake, args.host, args.port)
+    print(f"Fake LLM listening on http://{args.host}:{args.port}/v1")
+    server.serve_forever()
@@ -0,0 +1,83 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+def make_cache_key(model, params, prompt):
+    """
+    Build a stable cache key for an LLM call.
+
+    Args:
+        model (str): Model name, e.g. "gpt-4o"
+        params (dict): Sampling parameters sent with the call (temperature, max_tokens, ...)
+        prompt (str): The full prompt sent to the model
+
+    Returns:
+        str: Hex SHA-256 digest identifying the call
+    """
+    payload = json.dumps({'model': model, 'params': params, 'prompt': prompt}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class LRUCache:
+    """Thread-safe in-process LRU cache with a maximum size and per-entry TTL."""
+
+    def __init__(self, max_size=1024, ttl=3600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached value for key, or None if it is missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        """Store value under key, evicting the least recently used entries if full."""
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+class CacheStats:
+    """Thread-safe hit/miss counters per cache tier."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {'memory_hits': 0, 'db_hits': 0, 'misses': 0, 'bypassed': 0}
+
+    def incr(self, name):
+        with self._lock:
+            self._counts[name] += 1
+
+    def snapshot(self):
+        with self._lock:
+            counts = dict(self._counts)
+        lookups = counts['memory_hits'] + counts['db_hits'] + counts['misses']
+        counts['hit_rate'] = (counts['memory_hits'] + counts['db_hits']) / lookups if lookups > 0 else 0.0
+        return counts
@@ -0,0 +1,171 @@
+import contextvars
+import os
+import random
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+TRANSIENT_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+def is_transient_error(exc):
+    """Whether an LLM call error is worth retrying (rate limits, 5xx, timeouts, dropped connections)."""
+    status_code = getattr(exc, 'status_code', None)
+    if status_code is not None:
+        return status_code in TRANSIENT_STATUS_CODES
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    # Not imported up front: the openai package is slow to import and is only loaded
+    # once the OpenAI backend creates its client, so before that no such error exists
+    openai = sys.modules.get('openai')
+    return openai is not None and isinstance(exc, openai.APIConnectionError)  # APITimeoutError is a subclass
+
+
+class DeadlineExceeded(TimeoutError):
+    """The per-submission deadline passed before the LLM call succeeded."""
+
+
+class LatencyTracker:
+    """Rolling window of recent successful call latencies."""
+
+    def __init__(self, window=500, min_samples=20):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def quantile(self, q):
+        """Latency at quantile q, or None until enough samples have been seen."""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class RetryingCaller:
+    """
+    Runs LLM calls with retries and optional hedging.
+
+    Transient errors are retried with exponential backoff and full jitter. No attempt
+    starts (and no backoff sleep runs) past the caller's deadline. With hedging on, a
+    duplicate request is fired once a call has run longer than the recent p95 latency;
+    whichever finishes first successfully wins.
+
+    The p95 comes from record_latency(), which the caller reports around the upstream
+    request itself, so time spent queueing for rate-limit budget doesn't inflate it. No
+    hedge is fired while throttled() is true: the duplicate would only queue for budget
+    too, adding load just when the provider is saturated.
+    """
+
+    def __init__(self, max_attempts=3, base_delay=0.5, max_delay=8.0, hedge=False,
+                 hedge_quantile=0.95, hedge_min_samples=20, max_hedge_workers=16, throttled=None):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.throttled = throttled
+        self.latencies = LatencyTracker(min_samples=hedge_min_samples)
+        # Hedged calls run on their own pool; callers may already be on a bounded executor
+        self._hedge_executor = ThreadPoolExecutor(max_workers=max_hedge_workers, thread_name_prefix='llm-hedge') if hedge else None
+
+    def call(self, fn, deadline=None, stats=None):
+        """
+        Call fn() until it succeeds, a non-transient error occurs, attempts run out or the deadline passes.
+
+        Args:
+            fn (callable): Performs one upstream LLM request
+            deadline (float): time.monotonic() value after which no new attempt is made
+            stats (dict): Optional counters updated in place: attempts, retries, hedges
+
+        Returns:
+            The return value of fn()
+        """
+        stats = stats if stats is not None else {}
+        for key in ('attempts', 'retries', 'hedges'):
+            stats.setdefault(key, 0)
+
+        attempt = 0
+        while True:
+            attempt += 1
+            stats['attempts'] += 1
+            try:
+                return self._attempt(fn, deadline, stats)
+            except Exception as e:
+                if attempt >= self.max_attempts or not is_transient_error(e) or isinstance(e, DeadlineExceeded):
+                    raise
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+                if deadline is not None and time.monotonic() + delay >= deadline:
+                    raise
+                stats['retries'] += 1
+                time.sleep(delay)
+
+    def record_latency(self, seconds):
+        """Report how long a successful upstream request took, for the hedging threshold."""
+        self.latencies.record(seconds)
+
+    def _is_throttled(self):
+        return self.throttled is not None and self.throttled()
+
+    def _submit(self, fn):
+        # Each call gets its own copy of the caller's context, so per-request state such as
+        # stage timings follows it onto the hedge pool (a context can't be entered twice at once)
+        return self._hedge_executor.submit(contextvars.copy_context().run, fn)
+
+    def _attempt(self, fn, deadline, stats):
+        if deadline is not None and time.monotonic() >= deadline:
+            raise DeadlineExceeded('Submission deadline exceeded before the LLM call could start')
+
+        hedge_after = self.latencies.quantile(self.hedge_quantile) if self.hedge else None
+        if hedge_after is None or self._is_throttled():
+            return fn()
+
+        remaining = deadline - time.monotonic() if deadline is not None else None
+        primary = self._submit(fn)
+        done, _ = wait([primary], timeout=hedge_after if remaining is None else min(hedge_after, remaining))
+        if done:
+            return primary.result()
+
+        pending = {primary}
+        if not self._is_throttled():
+            stats['hedges'] += 1
+            pending.add(self._submit(fn))
+        last_error = None
+        while pending:
+            remaining = deadline - time.monotonic() if deadline is not None else None
+            if remaining is not None and remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                last_error = future.exception()
+        if last_error is not None and not pending:
+            raise last_error
+        raise DeadlineExceeded('Submission deadline exceeded while waiting for the LLM')
+
+
+def create_caller_from_env(max_concurrent_calls=8, throttled=None):
+    """
+    Build the retry/hedging policy from LLM_MAX_ATTEMPTS, LLM_RETRY_*, and LLM_HEDGE* settings.
+
+    Once hedging is warm every call runs on the hedge pool, so it is sized for a primary
+    and a hedge per concurrent call. throttled() should say whether callers are currently
+    waiting for rate-limit budget.
+    """
+    return RetryingCaller(
+        max_attempts=int(os.getenv('LLM_MAX_ATTEMPTS', '3')),
+        base_delay=float(os.getenv('LLM_RETRY_BASE_DELAY', '0.5')),
+        max_delay=float(os.getenv('LLM_RETRY_MAX_DELAY', '8')),
+        hedge=os.getenv('LLM_HEDGE', 'false').lower() == 'true',
+        hedge_quantile=float(os.getenv('LLM_HEDGE_QUANTILE', '0.95')),
+        hedge_min_samples=int(os.getenv('LLM_HEDGE_MIN_SAMPLES', '20')),
+        max_hedge_workers=2 * max_concurrent_calls,
+        throttled=throttled
+    )
@@ -0,0 +1,364 @@
+"""
+Load test /submit-prompt, /questions and /profile against a locally started server.
+
+The app is started with the fake LLM backend (configurable latency and failure rate)
+on a throwaway SQLite database, or on --database-url. Users and questions are seeded
+first, then a fixed number of client threads send a weighted mix of requests for
+--duration seconds. Latency percentiles, throughput and error rates per endpoint are
+written as JSON (with the git commit), so runs can be compared across commits:
+
+    python loadtest.py --concurrency 32 --duration 60 --llm-latency-ms 400
+    python loadtest.py --output after.json --compare before.json
+
+Against Postgres, point --database-url at a dedicated database; the seed data is added
+to it and submissions are written to it.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+ENDPOINTS = ('submit', 'questions', 'profile')
+SEED_PASSWORD = 'loadtest-password'
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=REPO_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def build_env(args, scratch_dir):
+    """Environment shared by the seeding step and the server process."""
+    env = dict(os.environ)
+    env.update({
+        'DATABASE_URL': args.database_url or f'sqlite:///{os.path.join(scratch_dir, "loadtest.db")}',
+        'LLM_BACKEND': 'fake',
+        'FAKE_LLM_LATENCY_MS': str(args.llm_latency_ms),
+        'FAKE_LLM_LATENCY_SIGMA': str(args.llm_latency_sigma),
+        'FAKE_LLM_FAILURE_RATE': str(args.llm_failure_rate),
+        'FAKE_LLM_SEED': str(args.seed),
+        'LLM_RATE_LIMIT_DB': os.path.join(scratch_dir, 'rate_limit.sqlite'),
+        'LLM_SINGLEFLIGHT_DB': os.path.join(scratch_dir, 'inflight.sqlite'),
+        'JWT_SECRET_KEY': env.get('JWT_SECRET_KEY', 'loadtest-jwt-secret-key-0123456789'),
+        'OPENAI_API_KEY': env.get('OPENAI_API_KEY', 'unused'),
+    })
+    return env
+
+
+def seed(args, env):
+    """
+    Create the schema, users and extra questions, and return (access tokens, question ids).
+
+    Runs in this process with the server's environment; users share one password hash
+    so seeding doesn't spend minutes in bcrypt.
+    """
+    os.environ.update(env)
+    sys.path.insert(0, REPO_DIR)
+    import app as server
+    from flask_jwt_extended import create_access_token
+    from sqlalchemy import insert
+
+    with server.create_app().app_context():
+        server.init_db()
+        sample = server.Question.query.order_by(server.Question.id).first()
+        existing = {question_id for (question_id,) in server.db.session.query(server.Question.id)}
+        new_questions = [
+            {
+                'id': f'loadtest_q{i:04d}',
+                'title': f'Load test question {i}',
+                'description': sample.description,
+                'test_cases': sample.test_cases,
+                'difficulty': ('easy', 'medium', 'hard')[i % 3],
+                'category': sample.category
+            }
+            for i in range(args.questions) if f'loadtest_q{i:04d}' not in existing
+        ]
+        if new_questions:
+            server.db.session.execute(insert(server.Question), new_questions)
+
+        password_hash = server.bcrypt.generate_password_hash(SEED_PASSWORD).decode('utf-8')
+        existing = {name for (name,) in server.db.session.query(server.User.username)
+                    .filter(server.User.username.like('loadtest_user%'))}
+        new_users = [
+            {'username': f'loadtest_user{i:05d}', 'email': f'loadtest_user{i:05d}@example.com',
+             'password_hash': password_hash, 'date_joined': datetime.utcnow()}
+            for i in range(args.users) if f'loadtest_user{i:05d}' not in existing
+        ]
+        if new_users:
+            server.db.session.execute(insert(server.User), new_users)
+        server.db.session.commit()
+
+        user_ids = [user_id for (user_id,) in server.db.session.query(server.User.id)
+                    .filter(server.User.username.like('loadtest_user%')).order_by(server.User.id).limit(args.users)]
+        tokens = [create_access_token(identity=str(user_id)) for user_id in user_ids]
+        question_ids = [question_id for (question_id,) in server.db.session.query(server.Question.id)]
+    return tokens, question_ids
+
+
+def start_server(env, port, log_path):
+    log = open(log_path, 'w')
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'flask', '--app', 'app', 'run', '--port', str(port),
+         '--no-reload', '--no-debugger', '--with-threads'],
+        cwd=REPO_DIR, env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+    started = time.monotonic()
+    deadline = started + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'Server exited during startup; see {log_path}')
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('GET', '/health')
+            if conn.getresponse().status == 200:
+                return process, time.monotonic() - started
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f'Server did not become healthy; see {log_path}')
+
+
+class TrafficClient:
+    """One client thread's worth of requests, picking endpoints by weight."""
+
+    def __init__(self, port, tokens, question_ids, mix, prompt_pool, rng):
+        self.port = port
+        self.tokens = tokens
+        self.question_ids = question_ids
+        self.endpoints = list(mix)
+        self.weights = [mix[endpoint] for endpoint in self.endpoints]
+        self.prompt_pool = prompt_pool
+        self.rng = rng
+
+    def _request(self, method, path, token, body=None):
+        conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=120)
+        headers = {'Authorization': f'Bearer {token}'}
+        if body is not None:
+            headers['Content-Type'] = 'application/json'
+            body = json.dumps(body)
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            return response.status
+        finally:
+            conn.close()
+
+    def _prompt(self):
+        variant = self.rng.randrange(self.prompt_pool) if self.prompt_pool else self.rng.getrandbits(64)
+        return f'Return only the matching records as a JSON array. (variant {variant})'
+
+    def run_one(self):
+        """Send one request; returns (endpoint, seconds, ok)."""
+        endpoint = self.rng.choices(self.endpoints, self.weights)[0]
+        token = self.rng.choice(self.tokens)
+        started = time.perf_counter()
+        try:
+            if endpoint == 'submit':
+                status = self._request('POST', '/submit-prompt', token, {
+                    'question_id': self.rng.choice(self.question_ids),
+                    'user_prompt': self._prompt()
+                })
+            elif endpoint == 'questions':
+                status = self._request('GET', '/questions?limit=50', token)
+            else:
+                status = self._request('GET', '/profile', token)
+            ok = 200 <= status < 300
+        except OSError:
+            ok = False
+        return endpoint, time.perf_counter() - started, ok
+
+
+def drive(port, tokens, question_ids, args):
+    """Run the traffic mix and collect (endpoint, seconds, ok, finished_at) samples."""
+    mix = {endpoint: weight for endpoint, weight in args.mix.items() if weight > 0}
+    samples = []
+    samples_lock = threading.Lock()
+    started = time.monotonic()
+    measure_from = started + args.warmup
+    stop_at = measure_from + args.duration
+
+    def worker(index):
+        client = TrafficClient(port, tokens, question_ids, mix, args.prompt_pool, random.Random(args.seed + index))
+        local = []
+        while time.monotonic() < stop_at:
+            endpoint, seconds, ok = client.run_one()
+            finished_at = time.monotonic()
+            if finished_at >= measure_from and finished_at <= stop_at:
+                local.append((endpoint, seconds, ok))
+        with samples_lock:
+            samples.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples
+
+
+def summarize(samples, duration):
+    def stats(selected):
+        latencies = sorted(seconds * 1000 for _, seconds, _ in selected)
+        errors = sum(1 for _, _, ok in selected if not ok)
+        return {
+            'requests': len(selected),
+            'errors': errors,
+            'error_rate': errors / len(selected) if selected else 0.0,
+            'throughput_rps': round(len(selected) / duration, 2),
+            'latency_ms': {
+                'p50': _percentile(latencies, 0.50),
+                'p95': _percentile(latencies, 0.95),
+                'p99': _percentile(latencies, 0.99),
+                'mean': sum(latencies) / len(latencies) if latencies else None,
+                'max': latencies[-1] if latencies else None
+            }
+        }
+
+    result = {'overall': stats(samples), 'endpoints': {}}
+    for endpoint in ENDPOINTS:
+        selected = [sample for sample in samples if sample[0] == endpoint]
+        if selected:
+            result['endpoints'][endpoint] = stats(selected)
+    for section in [result['overall']] + list(result['endpoints'].values()):
+        section['latency_ms'] = {key: round(value, 2) if value is not None else None
+                                 for key, value in section['latency_ms'].items()}
+    return result
+
+
+def scrape_stage_totals(port):
+    """Per-stage count and total seconds from the server's /metrics, for attributing latency."""
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    conn.request('GET', '/metrics')
+    text = conn.getresponse().read().decode('utf-8')
+    stages = {}
+    for kind, stage, value in re.findall(r'^llm_leetcode_stage_seconds_(sum|count)\{stage="([^"]+)"\} (\S+)$', text, re.M):
+        stages.setdefault(stage, {})['seconds' if kind == 'sum' else 'count'] = float(value)
+    return stages
+
+
+def compare(current, baseline):
+    """Print p50/p95/p99 and throughput side by side with a baseline result."""
+    print(f"\nCompared with {baseline['meta'].get('commit') or 'baseline'}:")
+    for endpoint in ('overall',) + ENDPOINTS:
+        now = current['overall'] if endpoint == 'overall' else current['endpoints'].get(endpoint)
+        before = baseline['overall'] if endpoint == 'overall' else baseline['endpoints'].get(endpoint)
+        if not now or not before:
+            continue
+        parts = []
+        for key in ('p50', 'p95', 'p99'):
+            old, new = before['latency_ms'][key], now['latency_ms'][key]
+            change = f'{(new - old) / old * 100:+.1f}%' if old else 'n/a'
+            parts.append(f'{key} {old}->{new}ms ({change})')
+        parts.append(f"rps {before['throughput_rps']}->{now['throughput_rps']}")
+        parts.append(f"errors {before['error_rate']:.2%}->{now['error_rate']:.2%}")
+        print(f'  {endpoint:10s} ' + ', '.join(parts))
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        endpoint, _, weight = part.partition('=')
+        if endpoint not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f'Unknown endpoint {endpoint!r}; expected one of {ENDPOINTS}')
+        mix[endpoint] = float(weight)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the API with a fake LLM backend')
+    parser.add_argument('--database-url', help='Database to use (default: a throwaway SQLite file)')
+    parser.add_argument('--concurrency', type=int, default=16, help='Concurrent client threads')
+    parser.add_argument('--duration', type=float, default=30, help='Measured seconds of traffic')
+    parser.add_argument('--warmup', type=float, default=5, help='Seconds of traffic before measuring')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix('submit=1,questions=3,profile=2'),
+                        help='Endpoint weights, e.g. submit=1,questions=3,profile=2')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--questions', type=int, default=50, help='Extra generated questions')
+    parser.add_argument('--prompt-pool', type=int, default=20,
+                        help='Distinct prompts to draw from (0 = every prompt unique, no cache hits)')
+    parser.add_argument('--llm-latency-ms', type=float, default=500)
+    parser.add_argument('--llm-latency-sigma', type=float, default=0.5)
+    parser.add_argument('--llm-failure-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='Where to write the JSON results (default: loadtest-results/<commit>.json)')
+    parser.add_argument('--compare', help='Earlier results file to compare against')
+    args = parser.parse_args()
+
+    commit = _git_commit()
+    output = args.output or os.path.join(REPO_DIR, 'loadtest-results', f'{(commit or "unknown")[:12]}.json')
+
+    with tempfile.TemporaryDirectory(prefix='llm-leetcode-loadtest-') as scratch_dir:
+        env = build_env(args, scratch_dir)
+        print('Seeding database...')
+        tokens, question_ids = seed(args, env)
+
+        port = _free_port()
+        log_path = os.path.join(scratch_dir, 'server.log')
+        print(f'Starting server on port {port}...')
+        server, startup_seconds = start_server(env, port, log_path)
+        print(f'Server healthy {startup_seconds:.2f}s after launch')
+        try:
+            print(f'Running {args.concurrency} clients for {args.warmup}s warmup + {args.duration}s...')
+            samples = drive(port, tokens, question_ids, args)
+            stages = scrape_stage_totals(port)
+        finally:
+            server.terminate()
+            try:
+                server.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                server.kill()
+
+    results = summarize(samples, args.duration)
+    results['server_stages'] = stages
+    results['server_startup_seconds'] = round(startup_seconds, 3)
+    results['meta'] = {
+        'commit': commit,
+        'timestamp': datetime.utcnow().isoformat(),
+        'database': 'sqlite' if not args.database_url else args.database_url.split(':', 1)[0],
+        'config': {key: value for key, value in vars(args).items() if key not in ('output', 'compare', 'database_url')}
+    }
+
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    for endpoint, section in [('overall', results['overall'])] + list(results['endpoints'].items()):
+        latency = section['latency_ms']
+        print(f"{endpoint:10s} {section['requests']:6d} req  {section['throughput_rps']:8.2f} rps  "
+              f"p50 {latency['p50']}ms  p95 {latency['p95']}ms  p99 {latency['p99']}ms  "
+              f"errors {section['error_rate']:.2%}")
+    print(f'Results written to {output}')
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,34 @@
+import os
+import sqlite3
+import threading
+
+
+class LocalSQLite:
+    """
+    Per-thread connections to a SQLite file shared by the workers on this host.
+
+    Nothing is opened until first use. A forked child opens its own connections, since
+    a SQLite connection can't be used across a fork. setup(conn), if given, runs on the
+    first connection in each process, to create the file's tables.
+    """
+
+    def __init__(self, path, timeout=10.0, setup=None):
+        self.path = path
+        self.timeout = timeout
+        self._setup = setup
+        self._setup_pid = None
+        self._setup_lock = threading.Lock()
+        self._local = threading.local()
+
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+            if self._setup is not None and self._setup_pid != os.getpid():
+                with self._setup_lock:
+                    if self._setup_pid != os.getpid():
+                        self._setup(conn)
+                        self._setup_pid = os.getpid()
+        return conn
@@ -0,0 +1,81 @@
+def canonicalize(value):
+    """
+    Convert a parsed JSON value to a hashable form with the same equality semantics.
+
+    Two values are == exactly when their canonical forms are ==, so canonical forms can
+    be used as dict/set keys in place of (unhashable) dicts and lists.
+    """
+    if isinstance(value, dict):
+        return ('dict', frozenset((key, canonicalize(item)) for key, item in value.items()))
+    if isinstance(value, list):
+        return ('list', tuple(canonicalize(item) for item in value))
+    return value
+
+
+class EntryMatcher:
+    """
+    Matches a model's response entries against a test case's expected entries.
+
+    An expected entry (a dict) is found when some response dict has every one of its
+    keys with an equal value; extra keys in the response are allowed. Expected entries
+    are grouped by key set, and for each group the response entries are indexed once
+    by their projection onto those keys, so matching is a hash lookup per entry
+    instead of a scan of the whole response.
+    """
+
+    def __init__(self, expected_output):
+        """
+        Args:
+            expected_output (list): Expected entries (dicts wrapped in a list by the caller)
+        """
+        self.expected_output = expected_output
+        # key set -> [(position in expected_output, canonical projection)]
+        self._groups = {}
+        for position, expected_entry in enumerate(expected_output):
+            if isinstance(expected_entry, dict):
+                keys = tuple(sorted(expected_entry.keys()))
+                projection = tuple(canonicalize(expected_entry[key]) for key in keys)
+                self._groups.setdefault(keys, []).append((position, projection))
+
+    def match(self, parsed_response):
+        """
+        Compare a parsed response (a list) against the expected entries.
+
+        Returns:
+            tuple: (found_entries, missing_entries, extra_entries). A response entry may
+            satisfy several expected entries, and any response entry equal to a found
+            entry is not counted as extra.
+        """
+        response_dicts = [entry for entry in parsed_response if isinstance(entry, dict)]
+        match_by_position = {}
+
+        for keys, expected in self._groups.items():
+            # First response entry (in response order) for each projection onto these keys
+            index = {}
+            for response_entry in response_dicts:
+                if all(key in response_entry for key in keys):
+                    projection = tuple(canonicalize(response_entry[key]) for key in keys)
+                    index.setdefault(projection, response_entry)
+
+            for position, projection in expected:
+                response_entry = index.get(projection)
+                if response_entry is not None:
+                    match_by_position[position] = response_entry
+
+        found_entries = []
+        missing_entries = []
+        for position, expected_entry in enumerate(self.expected_output):
+            if position in match_by_position:
+                found_entries.append(match_by_position[position])
+            else:
+                missing_entries.append(expected_entry)
+
+        found_keys = {canonicalize(entry) for entry in found_entries}
+        extra_entries = [entry for entry in parsed_response if canonicalize(entry) not in found_keys]
+
+        return found_entries, missing_entries, extra_entries
+
+
+def match_entries(expected_output, parsed_response):
+    """Match a response against expected entries; see EntryMatcher.match."""
+    return EntryMatcher(expected_output).match(parsed_response)
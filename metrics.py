@@ -0,0 +1,204 @@
+import contextvars
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from cache hits (sub-millisecond) up to slow LLM calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_current_timings = contextvars.ContextVar('request_timings', default=None)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'{self.name} expects labels {self.labelnames}, got {tuple(labels)}')
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(self._samples())
+        return '\n'.join(lines)
+
+
+class Counter(_Metric):
+    """Monotonically increasing count, optionally split by labels."""
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        # An unlabelled counter is exported as 0 until its first increment
+        self._values = {} if self.labelnames else {(): 0}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        with self._lock:
+            values = dict(self._values)
+        return [
+            f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}'
+            for key, value in sorted(values.items())
+        ]
+
+
+class Gauge(_Metric):
+    """Point-in-time value read from a callback when the metrics are rendered."""
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, read):
+        super().__init__(name, documentation)
+        self._read = read
+
+    def _samples(self):
+        return [f'{self.name} {_format_value(self._read())}']
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram (with sum and count), optionally split by labels."""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._series = {}  # labels -> [per-bucket counts, sum, count]
+        if not self.labelnames:
+            self._series[()] = [[0] * len(self.buckets), 0.0, 0]
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def _samples(self):
+        with self._lock:
+            series = {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+        lines = []
+        for key, (counts, total, count) in sorted(series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, [('le', _format_value(bound))])
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class MetricsRegistry:
+    """Holds this process's metrics and renders them in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics = []
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name, documentation, read):
+        return self._register(Gauge(name, documentation, read))
+
+    def render(self):
+        return '\n'.join(metric.render() for metric in self._metrics) + '\n'
+
+
+class RequestTimings:
+    """Per-request totals of time spent in each stage, for a timing breakdown in the response."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}  # stage -> [count, seconds]
+        self._started = time.perf_counter()
+
+    def add(self, stage, seconds):
+        with self._lock:
+            entry = self._stages.setdefault(stage, [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+
+    def as_dict(self):
+        """Milliseconds per stage. Stages that ran concurrently (LLM calls) can add up to more than total_ms."""
+        with self._lock:
+            stages = {
+                stage: {'count': count, 'ms': round(seconds * 1000, 2)}
+                for stage, (count, seconds) in self._stages.items()
+            }
+        return {'total_ms': round((time.perf_counter() - self._started) * 1000, 2), 'stages': stages}
+
+    def server_timing(self):
+        """Value for a Server-Timing response header."""
+        timings = self.as_dict()
+        parts = [f'{stage};dur={entry["ms"]}' for stage, entry in timings['stages'].items()]
+        parts.append(f'total;dur={timings["total_ms"]}')
+        return ', '.join(parts)
+
+
+def start_request_timings():
+    """Start collecting a timing breakdown for the current request (or thread) and return it."""
+    timings = RequestTimings()
+    _current_timings.set(timings)
+    return timings
+
+
+class StageTimer:
+    """Times named stages into a histogram and into the current request's breakdown, if any."""
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def record(self, stage, seconds):
+        self.histogram.observe(seconds, stage=stage)
+        timings = _current_timings.get()
+        if timings is not None:
+            timings.add(stage, seconds)
+
+    @contextmanager
+    def time(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - started)
@@ -0,0 +1,174 @@
+import os
+import tempfile
+import threading
+import time
+
+from local_sqlite import LocalSQLite
+
+
+class RateLimitTimeout(Exception):
+    """Raised when budget did not become available within the limiter's max wait."""
+
+
+class TokenBucketLimiter:
+    """
+    Requests-per-minute and tokens-per-minute token buckets shared across processes.
+
+    Bucket state lives in a small SQLite file; every admission runs inside a
+    `BEGIN IMMEDIATE` transaction, so all workers on the host draw from the same budget.
+    Each bucket holds up to one minute of budget and refills continuously.
+    A limit of 0 disables that bucket.
+    """
+
+    def __init__(self, path, rpm=0, tpm=0, max_wait=30.0):
+        self.path = path
+        self.limits = {'requests': rpm, 'tokens': tpm}
+        self.max_wait = max_wait
+        # The bucket file is only created once a limited call needs it
+        self._db = LocalSQLite(path, timeout=max_wait + 5, setup=self._init_db)
+        self._stats_lock = threading.Lock()
+        self._stats = {'admitted': 0, 'waited': 0, 'timed_out': 0, 'total_wait_seconds': 0.0}
+        self._waiting = 0
+
+    @property
+    def enabled(self):
+        return any(limit > 0 for limit in self.limits.values())
+
+    def _connection(self):
+        return self._db.connection()
+
+    def waiting(self):
+        """Number of this process's callers currently sleeping for budget."""
+        with self._stats_lock:
+            return self._waiting
+
+    def _init_db(self, conn):
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS buckets ('
+            'name TEXT PRIMARY KEY, level REAL NOT NULL, updated_at REAL NOT NULL)'
+        )
+        now = time.time()
+        for name, limit in self.limits.items():
+            conn.execute(
+                'INSERT OR IGNORE INTO buckets (name, level, updated_at) VALUES (?, ?, ?)',
+                (name, float(limit), now)
+            )
+
+    def _refill(self, conn, now):
+        levels = {}
+        for name, level, updated_at in conn.execute('SELECT name, level, updated_at FROM buckets'):
+            limit = self.limits.get(name, 0)
+            if limit > 0:
+                levels[name] = min(float(limit), level + (now - updated_at) * limit / 60.0)
+        return levels
+
+    def _write(self, conn, levels, now):
+        for name, level in levels.items():
+            conn.execute('UPDATE buckets SET level = ?, updated_at = ? WHERE name = ?', (level, now, name))
+
+    def acquire(self, estimated_tokens):
+        """
+        Block until one request and `estimated_tokens` tokens are available, then take them.
+
+        Returns:
+            int: The number of tokens reserved, to be passed to reconcile() after the call
+
+        Raises:
+            RateLimitTimeout: If the budget is not available within max_wait seconds
+        """
+        if not self.enabled:
+            return 0
+
+        # A single call larger than the whole bucket could never be admitted otherwise
+        needed = {'requests': 1, 'tokens': estimated_tokens}
+        for name, limit in self.limits.items():
+            if limit > 0:
+                needed[name] = min(needed[name], limit)
+
+        started = time.time()
+        deadline = started + self.max_wait
+        conn = self._connection()
+
+        while True:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                now = time.time()
+                levels = self._refill(conn, now)
+                shortfall = {name: needed[name] - level for name, level in levels.items() if level < needed[name]}
+                if not shortfall:
+                    for name in levels:
+                        levels[name] -= needed[name]
+                self._write(conn, levels, now)
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+
+            if not shortfall:
+                waited = now - started
+                with self._stats_lock:
+                    self._stats['admitted'] += 1
+                    if waited > 0.001:
+                        self._stats['waited'] += 1
+                        self._stats['total_wait_seconds'] += waited
+                return needed['tokens']
+
+            if now >= deadline:
+                with self._stats_lock:
+                    self._stats['timed_out'] += 1
+                raise RateLimitTimeout(f'LLM rate limit budget unavailable after {self.max_wait:.0f}s')
+
+            # Sleep until the scarcest bucket should have refilled enough, bounded by the deadline
+            wait = max(shortfall[name] * 60.0 / self.limits[name] for name in shortfall)
+            with self._stats_lock:
+                self._waiting += 1
+            try:
+                time.sleep(min(max(wait, 0.01), deadline - now))
+            finally:
+                with self._stats_lock:
+                    self._waiting -= 1
+
+    def reconcile(self, reserved_tokens, actual_tokens):
+        """Correct the token bucket once the real usage of an admitted call is known."""
+        if not self.enabled or self.limits['tokens'] <= 0 or reserved_tokens == actual_tokens:
+            return
+
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            now = time.time()
+            levels = self._refill(conn, now)
+            # Refund over-estimates, charge under-estimates; the level may briefly go negative
+            levels['tokens'] = min(float(self.limits['tokens']), levels['tokens'] + reserved_tokens - actual_tokens)
+            self._write(conn, levels, now)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def usage(self):
+        """Current shared budget levels plus this process's admission counters."""
+        result = {'enabled': self.enabled, 'max_wait_seconds': self.max_wait, 'buckets': {}}
+        if self.enabled:
+            conn = self._connection()
+            levels = self._refill(conn, time.time())
+            for name, level in levels.items():
+                limit = self.limits[name]
+                result['buckets'][name] = {
+                    'limit_per_minute': limit,
+                    'available': round(level, 2),
+                    'used_fraction': round(1 - level / limit, 4)
+                }
+        with self._stats_lock:
+            result['process'] = dict(self._stats, waiting=self._waiting)
+        return result
+
+
+def create_limiter_from_env():
+    """Build the shared limiter from LLM_RPM_LIMIT / LLM_TPM_LIMIT (0 or unset disables it)."""
+    return TokenBucketLimiter(
+        path=os.getenv('LLM_RATE_LIMIT_DB', os.path.join(tempfile.gettempdir(), 'llm_leetcode_rate_limit.sqlite')),
+        rpm=int(os.getenv('LLM_RPM_LIMIT', '0')),
+        tpm=int(os.getenv('LLM_TPM_LIMIT', '0')),
+        max_wait=float(os.getenv('LLM_RATE_LIMIT_MAX_WAIT', '30'))
+    )
@@ -0,0 +1,202 @@
+"""
+Re-grade stored prompt attempts with the current validation rules.
+
+Attempts are streamed from the database through a server-side cursor in chunks, the
+stored/cached model responses for every test case are replayed (no OpenAI calls unless
+--allow-llm is given), validation runs in parallel across CPU cores, and changed scores
+are written back with bulk updates. A summary of pass/fail changes is printed at the end.
+
+    python regrade.py [--question-id ID] [--chunk-size 500] [--workers N] [--dry-run] [--allow-llm]
+
+An attempt's `llm_response` only holds the first test case's output; the other cases are
+replayed from the llm_response_cache table. Attempts whose responses can't all be found
+are skipped (or re-run against the LLM with --allow-llm).
+"""
+import argparse
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlalchemy import select, update
+
+from app import (
+    LLM_PARAMS, LLMResponseCache, PromptAttempt, Question, QuestionValidator,
+    build_full_prompt, create_app, db, get_completion, make_cache_key, rebuild_user_stats
+)
+
+# Per-process compiled validators, built once by the pool initializer
+_validators = {}
+
+
+def _init_worker(question_test_cases):
+    for question_id, test_cases in question_test_cases.items():
+        _validators[question_id] = QuestionValidator(test_cases)
+
+
+def regrade_chunk(items):
+    """
+    Re-validate a chunk of attempts.
+
+    Args:
+        items (list): (attempt_id, question_id, [model response per test case]) tuples
+
+    Returns:
+        list: (attempt_id, new score, new success, passed case count) tuples
+    """
+    results = []
+    for attempt_id, question_id, responses in items:
+        validator = _validators[question_id]
+        passed_cases = sum(
+            1 for i, model_response in enumerate(responses)
+            if validator.validate(i, model_response)['pass']
+        )
+        total_cases = len(responses)
+        score = passed_cases / total_cases if total_cases > 0 else 0.0
+        results.append((attempt_id, score, score == 1.0, passed_cases))
+    return results
+
+
+def _cached_responses(keys):
+    """Look up stored responses by cache key, ignoring the cache TTL."""
+    if not keys:
+        return {}
+    rows = db.session.query(LLMResponseCache.cache_key, LLMResponseCache.response)\
+        .filter(LLMResponseCache.cache_key.in_(keys)).all()
+    return dict(rows)
+
+
+def _collect_responses(rows, questions, allow_llm):
+    """Gather every test case's response for each attempt in a chunk, preferring stored ones."""
+    keys_by_attempt = {}
+    for row in rows:
+        test_cases = questions[row.question_id]
+        keys_by_attempt[row.id] = [
+            make_cache_key(row.model, LLM_PARAMS, build_full_prompt(row.user_prompt, test_case['input']))
+            for test_case in test_cases
+        ]
+    cached = _cached_responses([key for keys in keys_by_attempt.values() for key in keys])
+
+    items, skipped = [], 0
+    for row in rows:
+        test_cases = questions[row.question_id]
+        responses = []
+        for i, key in enumerate(keys_by_attempt[row.id]):
+            model_response = cached.get(key)
+            if model_response is None and i == 0:
+                model_response = row.llm_response  # Parsed output of the first case, stored with the attempt
+            if model_response is None and allow_llm:
+                full_prompt = build_full_prompt(row.user_prompt, test_cases[i]['input'])
+                model_response, _, _ = get_completion(full_prompt)
+            if model_response is None:
+                break
+            responses.append(model_response)
+
+        if len(responses) == len(test_cases):
+            items.append((row.id, row.question_id, responses))
+        else:
+            skipped += 1
+    return items, skipped
+
+
+def _write_changes(changes):
+    # Bulk UPDATE by primary key
+    db.session.execute(update(PromptAttempt), changes)
+    db.session.commit()
+
+
+def regrade(question_id=None, chunk_size=500, workers=None, dry_run=False, allow_llm=False):
+    """
+    Re-grade stored attempts and write changed scores back.
+
+    Returns:
+        dict: Summary counts of scanned, skipped and changed attempts
+    """
+    questions = {question.id: question.test_cases for question in Question.query.all()}
+    summary = {
+        'scanned': 0, 'regraded': 0, 'skipped': 0, 'changed': 0,
+        'fail_to_pass': 0, 'pass_to_fail': 0,
+        'passed_before': 0, 'passed_after': 0,
+        'passed_cases_before': 0, 'passed_cases_after': 0
+    }
+
+    query = select(
+        PromptAttempt.id, PromptAttempt.question_id, PromptAttempt.user_prompt,
+        PromptAttempt.model, PromptAttempt.llm_response, PromptAttempt.score, PromptAttempt.success
+    ).order_by(PromptAttempt.id)
+    if question_id:
+        query = query.where(PromptAttempt.question_id == question_id)
+
+    workers = workers or os.cpu_count()
+    # SQLite has no server-side cursors and can't commit while another connection is
+    # reading, so there the updates are applied once the stream is finished
+    deferred_changes = [] if db.engine.dialect.name == 'sqlite' else None
+    started = time.monotonic()
+    # Read on a dedicated connection so the server-side cursor survives the per-chunk commits
+    with db.engine.connect() as stream_conn, \
+            ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(questions,)) as pool:
+        result = stream_conn.execution_options(stream_results=True, yield_per=chunk_size).execute(query)
+
+        for rows in result.partitions(chunk_size):
+            rows = [row for row in rows if row.question_id in questions]
+            summary['scanned'] += len(rows)
+            previous = {row.id: row for row in rows}
+
+            items, skipped = _collect_responses(rows, questions, allow_llm)
+            summary['skipped'] += skipped
+
+            # Split the chunk so every core gets a share
+            slice_size = max(1, len(items) // (workers * 2))
+            slices = [items[i:i + slice_size] for i in range(0, len(items), slice_size)]
+
+            changes = []
+            for regraded in pool.map(regrade_chunk, slices):
+                for attempt_id, score, success, passed_cases in regraded:
+                    old = previous[attempt_id]
+                    total_cases = len(questions[old.question_id])
+                    summary['regraded'] += 1
+                    summary['passed_before'] += int(bool(old.success))
+                    summary['passed_after'] += int(success)
+                    summary['passed_cases_before'] += round(old.score * total_cases)
+                    summary['passed_cases_after'] += passed_cases
+                    if score != old.score or success != bool(old.success):
+                        summary['changed'] += 1
+                        if success and not old.success:
+                            summary['fail_to_pass'] += 1
+                        elif old.success and not success:
+                            summary['pass_to_fail'] += 1
+                        changes.append({'id': attempt_id, 'score': score, 'success': success})
+
+            if changes and not dry_run:
+                if deferred_changes is not None:
+                    deferred_changes.extend(changes)
+                else:
+                    _write_changes(changes)
+
+    if deferred_changes:
+        for i in range(0, len(deferred_changes), chunk_size):
+            _write_changes(deferred_changes[i:i + chunk_size])
+
+    if summary['changed'] and not dry_run:
+        # Scores feed the per-user stats (successes, best score per question)
+        rebuild_user_stats()
+
+    summary['seconds'] = round(time.monotonic() - started, 2)
+    return summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Re-grade stored prompt attempts with the current validators')
+    parser.add_argument('--question-id', help='Only re-grade attempts for this question')
+    parser.add_argument('--chunk-size', type=int, default=500)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--dry-run', action='store_true', help='Report changes without writing them')
+    parser.add_argument('--allow-llm', action='store_true',
+                        help='Call the LLM for test cases with no stored or cached response')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    with create_app().app_context():
+        summary = regrade(args.question_id, args.chunk_size, args.workers, args.dry_run, args.allow_llm)
+    print(json.dumps(summary, indent=2))
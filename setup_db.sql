@@ -30,13 +30,70 @@ CREATE TABLE IF NOT EXISTS questions (
     expected_output JSONB NOT NULL,
     difficulty TEXT DEFAULT 'medium',
     category TEXT DEFAULT 'data_extraction',
+    created_at TIMESTAMP DEFAULT NOW(),
+    updated_at TIMESTAMP DEFAULT NOW()
+);
+
+-- Existing databases: questions.updated_at versions the cached per-question validators
+ALTER TABLE questions ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT NOW();
+
+CREATE TABLE IF NOT EXISTS llm_response_cache (
+    cache_key VARCHAR(64) PRIMARY KEY,
+    model TEXT NOT NULL,
+    response TEXT NOT NULL,
+    tokens_used INTEGER DEFAULT 0,
     created_at TIMESTAMP DEFAULT NOW()
 );
 
+CREATE TABLE IF NOT EXISTS submission_jobs (
+    id VARCHAR(36) PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    question_id TEXT NOT NULL,
+    user_prompt TEXT NOT NULL,
+    bypass_cache BOOLEAN DEFAULT FALSE,
+    batch BOOLEAN DEFAULT FALSE,
+    status TEXT DEFAULT 'queued',
+    completed_cases INTEGER DEFAULT 0,
+    total_cases INTEGER DEFAULT 0,
+    result JSONB,
+    error TEXT,
+    created_at TIMESTAMP DEFAULT NOW(),
+    updated_at TIMESTAMP DEFAULT NOW()
+);
+
+-- Running per-user totals, updated with every prompt_attempts insert
+CREATE TABLE IF NOT EXISTS user_stats (
+    user_id INTEGER PRIMARY KEY,
+    total_attempts INTEGER NOT NULL DEFAULT 0,
+    correct_solutions INTEGER NOT NULL DEFAULT 0,
+    tokens_used INTEGER NOT NULL DEFAULT 0,
+    last_attempt_at TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS user_question_stats (
+    user_id INTEGER NOT NULL,
+    question_id TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    best_score FLOAT NOT NULL DEFAULT 0,
+    best_tokens INTEGER NOT NULL DEFAULT 0,
+    best_attempt_id INTEGER,
+    best_at TIMESTAMP,
+    last_attempt_at TIMESTAMP,
+    PRIMARY KEY (user_id, question_id)
+);
+
+-- Leaderboard columns for databases created before they existed (then run: flask --app app rebuild-leaderboards)
+ALTER TABLE user_question_stats ADD COLUMN IF NOT EXISTS best_tokens INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE user_question_stats ADD COLUMN IF NOT EXISTS best_attempt_id INTEGER;
+ALTER TABLE user_question_stats ADD COLUMN IF NOT EXISTS best_at TIMESTAMP;
+
 -- Create indexes for better performance
 CREATE INDEX IF NOT EXISTS idx_prompt_attempts_user_id ON prompt_attempts(user_id);
 CREATE INDEX IF NOT EXISTS idx_prompt_attempts_question_id ON prompt_attempts(question_id);
 CREATE INDEX IF NOT EXISTS idx_prompt_attempts_created_at ON prompt_attempts(created_at);
+CREATE INDEX IF NOT EXISTS idx_prompt_attempts_user_created ON prompt_attempts(user_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_submission_jobs_status ON submission_jobs(status, updated_at);
+CREATE INDEX IF NOT EXISTS idx_user_question_stats_leaderboard ON user_question_stats(question_id, best_score DESC, best_tokens, best_at);
 CREATE INDEX IF NOT EXISTS idx_questions_category ON questions(category);
 CREATE INDEX IF NOT EXISTS idx_questions_difficulty ON questions(difficulty);
 
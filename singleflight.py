@@ -0,0 +1,114 @@
+import threading
+import time
+
+from local_sqlite import LocalSQLite
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key into a single execution.
+
+    The first caller for a key runs fn(); callers arriving while it is in flight block
+    and receive the same result (or exception) instead of repeating the work.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._stats = {'leaders': 0, 'coalesced': 0, 'remote_coalesced': 0}
+
+    def do(self, key, fn, timeout=None):
+        """
+        Run fn() once for all concurrent callers with the same key.
+
+        Returns:
+            tuple: (fn's result, whether this caller shared another caller's execution)
+
+        Raises:
+            TimeoutError: If a follower waits longer than timeout seconds
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self._stats['leaders'] += 1
+            else:
+                self._stats['coalesced'] += 1
+
+        if not leader:
+            if not call.done.wait(timeout):
+                raise TimeoutError('Timed out waiting for an identical in-flight LLM call')
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+            return call.result, False
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def record_remote_coalesced(self):
+        with self._lock:
+            self._stats['remote_coalesced'] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_flight'] = len(self._calls)
+        return stats
+
+
+class InflightLockTable:
+    """
+    Cross-process lock table (a local SQLite file) marking which keys some worker is already fetching.
+
+    Locks older than stale_after seconds are treated as abandoned by a crashed worker.
+    """
+
+    def __init__(self, path, stale_after=120.0, poll_interval=0.05):
+        self.path = path
+        self.stale_after = stale_after
+        self.poll_interval = poll_interval
+        self._db = LocalSQLite(path, timeout=10, setup=lambda conn: conn.execute(
+            'CREATE TABLE IF NOT EXISTS inflight (key TEXT PRIMARY KEY, acquired_at REAL NOT NULL)'
+        ))
+
+    def _connection(self):
+        return self._db.connection()
+
+    def acquire(self, key):
+        """Try to take the lock for key; returns False if another live worker holds it."""
+        conn = self._connection()
+        now = time.time()
+        conn.execute('DELETE FROM inflight WHERE key = ? AND acquired_at < ?', (key, now - self.stale_after))
+        cursor = conn.execute('INSERT OR IGNORE INTO inflight (key, acquired_at) VALUES (?, ?)', (key, now))
+        return cursor.rowcount == 1
+
+    def release(self, key):
+        self._connection().execute('DELETE FROM inflight WHERE key = ?', (key,))
+
+    def wait_released(self, key, timeout):
+        """Block until no worker holds key (or it goes stale); returns False on timeout."""
+        conn = self._connection()
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            row = conn.execute('SELECT acquired_at FROM inflight WHERE key = ?', (key,)).fetchone()
+            if row is None or row[0] < time.time() - self.stale_after:
+                return True
+            time.sleep(self.poll_interval)
+        return False
@@ -0,0 +1,128 @@
+import logging
+import threading
+import time
+from collections import deque
+
+
+class BufferFull(Exception):
+    """The buffer held max_pending rows for the whole put() timeout."""
+
+
+class WriteBehindBuffer:
+    """
+    Buffers rows in memory and hands them to flush_fn in batches on a background thread.
+
+    A batch is flushed once max_batch rows are waiting or the oldest waiting row is
+    max_delay seconds old, whichever comes first. If flush_fn raises, the batch goes
+    back to the front of the buffer and is retried after a backoff, so rows are only
+    dropped from memory once flush_fn has returned. At most max_pending rows are held;
+    beyond that put() waits for room and then raises BufferFull.
+    """
+
+    def __init__(self, flush_fn, max_batch=100, max_delay=0.5, retry_delay=1.0, max_pending=10000,
+                 name='write-behind'):
+        self._flush_fn = flush_fn
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.retry_delay = retry_delay
+        self.max_pending = max_pending
+        self._name = name
+        self._items = deque()          # (enqueued_at, item)
+        self._in_flight = 0            # Rows taken by the flusher but not yet durable
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = None
+        self._stats = {'enqueued': 0, 'flushed': 0, 'batches': 0, 'flush_errors': 0, 'rejected': 0}
+
+    def start(self):
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self._name, daemon=True)
+                self._thread.start()
+
+    def put(self, item, timeout=1.0):
+        """
+        Queue a row for writing, waiting up to timeout seconds while the buffer is full.
+
+        Raises:
+            BufferFull: If max_pending rows are still waiting after the timeout (e.g. the
+                database is down); the caller should write the row itself or refuse it
+        """
+        self.start()
+        with self._cond:
+            has_room = lambda: self._closed or len(self._items) + self._in_flight < self.max_pending
+            if not self._cond.wait_for(has_room, timeout=timeout):
+                self._stats['rejected'] += 1
+                raise BufferFull(f'{self._name} has {self.max_pending} rows waiting to be written')
+            if self._closed:
+                raise RuntimeError('Write-behind buffer is closed')
+            self._items.append((time.monotonic(), item))
+            self._stats['enqueued'] += 1
+            # Wake the flusher to start the first row's timer, or because a batch is full.
+            # Writers waiting for room share the condition, so wake everyone.
+            if len(self._items) == 1 or len(self._items) >= self.max_batch:
+                self._cond.notify_all()
+
+    def pending(self):
+        """Number of rows accepted but not yet written (waiting or being flushed)."""
+        with self._cond:
+            return len(self._items) + self._in_flight
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats['pending'] = len(self._items) + self._in_flight
+            stats['max_pending'] = self.max_pending
+            if self._items:
+                stats['oldest_pending_seconds'] = round(time.monotonic() - self._items[0][0], 3)
+        return stats
+
+    def shutdown(self, timeout=None):
+        """Stop accepting rows and wait for everything already buffered to be flushed."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        remaining = self.pending()
+        if remaining:
+            logging.error(f"{self._name} shut down with {remaining} rows not written")
+
+    def _next_batch(self):
+        """Block until a batch is due; returns None once closed and drained."""
+        with self._cond:
+            while True:
+                if self._items:
+                    due_at = self._items[0][0] + self.max_delay
+                    wait = due_at - time.monotonic()
+                    if len(self._items) >= self.max_batch or wait <= 0 or self._closed:
+                        count = min(len(self._items), self.max_batch)
+                        batch = [self._items.popleft() for _ in range(count)]
+                        self._in_flight = count
+                        return batch
+                    self._cond.wait(wait)
+                elif self._closed:
+                    return None
+                else:
+                    self._cond.wait()
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            try:
+                self._flush_fn([item for _, item in batch])
+            except Exception as e:
+                logging.error(f"{self._name} flush of {len(batch)} rows failed, retrying: {e}")
+                with self._cond:
+                    self._items.extendleft(reversed(batch))
+                    self._in_flight = 0
+                    self._stats['flush_errors'] += 1
+                time.sleep(self.retry_delay)
+                continue
+            with self._cond:
+                self._in_flight = 0
+                self._stats['flushed'] += len(batch)
+                self._stats['batches'] += 1
+                self._cond.notify_all()  # Room for writers waiting in put()